@@ -0,0 +1,248 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page
+from django.db import connections
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from recipes.models import Recipe, RecipeQuerySet
+from recipes.relations import user_relations
+from .conditional import not_modified, recipe_validators, set_validators
+from .paginator import IdCursorPagination
+from .response_cache import cache_key, cached_data, store
+from .views import (FollowListAPIView, IngredientViewSet, RecipeViewSet,
+                    TagViewSet)
+
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix='async-db'
+)
+
+
+class Fallback(Exception):
+    """Запрос, который обрабатывает синхронное представление."""
+
+
+def release_broken_connections():
+    # Потоки пула держат свои соединения открытыми, как пул соединений,
+    # поэтому закрываем только сломанные — как close_old_connections.
+    for connection in connections.all():
+        if connection.connection is not None and connection.errors_occurred:
+            if connection.is_usable():
+                connection.errors_occurred = False
+            else:
+                connection.close()
+
+
+def run(func, *args, **kwargs):
+    release_broken_connections()
+    return func(*args, **kwargs)
+
+
+async def db(func, *args, **kwargs):
+    """Блокирующий вызов в пуле потоков ASYNC_DB_THREADS."""
+    return await sync_to_async(
+        run, thread_sensitive=False, executor=db_executor
+    )(func, *args, **kwargs)
+
+
+def json_response(data, cache=None):
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type='application/json'
+    )
+    patch_vary_headers(response, ('Accept',))
+    if cache is not None:
+        response['X-Cache'] = cache
+    return response
+
+
+def sync_only(request):
+    return (
+        request.method != 'GET' or 'format' in request.GET
+        or 'text/html' in request.META.get('HTTP_ACCEPT', '')
+    )
+
+
+def async_read(sync_view):
+    """JSON-ответы на GET — асинхронно, всё остальное — через sync_view.
+
+    Ошибки, перенаправления на другие страницы и браузерный API отдаёт
+    синхронное представление, поэтому ответы в этих случаях не меняются.
+    """
+    def decorator(read):
+        async def view(request, *args, **kwargs):
+            if not sync_only(request):
+                try:
+                    return await read(Request(request, authenticators=[
+                        authentication() for authentication
+                        in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+                    ]), *args, **kwargs)
+                except (APIException, Http404, Fallback):
+                    pass
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def pooled(sync_view):
+    """Синхронное представление целиком в пуле потоков БД."""
+    def handle(request, *args, **kwargs):
+        response = sync_view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+
+    async def view(request, *args, **kwargs):
+        return await db(handle, request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+async def paginate(view, queryset):
+    """Строки страницы; COUNT для номерной пагинации идёт параллельно."""
+    request = view.request
+    pagination = view.paginator
+    if IdCursorPagination.cursor_query_param in request.query_params:
+        return await db(pagination.paginate_queryset, queryset, request, view)
+    page_size = pagination.get_page_size(request)
+    try:
+        number = int(request.query_params.get(
+            pagination.page_query_param, 1
+        ))
+    except ValueError:
+        raise Fallback
+    if number < 1:
+        raise Fallback
+    offset = (number - 1) * page_size
+    paginator = pagination.django_paginator_class(queryset, page_size)
+    paginator.count, rows = await asyncio.gather(
+        db(queryset.count), db(list, queryset[offset:offset + page_size])
+    )
+    try:
+        paginator.validate_number(number)
+    except InvalidPage:
+        raise Fallback
+    pagination.page = Page(rows, number, paginator)
+    pagination.request = request
+    return rows
+
+
+async def prefetch(instances, lookups):
+    # Общий словарь заводим заранее: параллельные prefetch_related_objects
+    # пишут в него разные ключи и не затирают друг друга.
+    for instance in instances:
+        instance._prefetched_objects_cache = {}
+    await asyncio.gather(*(
+        db(prefetch_related_objects, instances, lookup) for lookup in lookups
+    ))
+
+
+def lookup_cached(request):
+    key = cache_key(request)
+    return key, cached_data(key)
+
+
+def recipe_view(request, action, **kwargs):
+    return RecipeViewSet(
+        request=request, action=action, format_kwarg=None, args=(),
+        kwargs=kwargs
+    )
+
+
+def page_data(view, rows):
+    return view.get_paginated_response(
+        view.get_serializer(rows, many=True).data
+    ).data
+
+
+@async_read(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def recipe_list(request):
+    user = await db(getattr, request, 'user')
+    key = None
+    if user.is_anonymous:
+        key, data = await db(lookup_cached, request)
+        if data is not None:
+            return json_response(data, cache='HIT')
+    view = recipe_view(request, 'list')
+    queryset, _ = await asyncio.gather(
+        db(view.filter_queryset, Recipe.objects.select_related('author')),
+        db(user_relations, user)
+    )
+    rows = await paginate(view, queryset)
+    await prefetch(rows, RecipeQuerySet.related_lookups())
+    data = await db(page_data, view, rows)
+    if key is None:
+        return json_response(data)
+    await db(store, key, data)
+    return json_response(data, cache='MISS')
+
+
+@async_read(RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'
+}))
+async def recipe_detail(request, pk):
+    user = await db(getattr, request, 'user')
+    rows = Recipe.objects.select_related('author').filter(pk=pk)
+    key = None
+    if user.is_anonymous:
+        (etag, last_modified), (key, data) = await asyncio.gather(
+            db(recipe_validators, request, pk), db(lookup_cached, request)
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        if data is not None:
+            return set_validators(
+                json_response(data, cache='HIT'), etag, last_modified
+            )
+        rows = await db(list, rows)
+    else:
+        (etag, last_modified), rows = await asyncio.gather(
+            db(recipe_validators, request, pk), db(list, rows)
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+    if not rows:
+        raise Http404
+    await prefetch(rows, RecipeQuerySet.related_lookups())
+    view = recipe_view(request, 'retrieve', pk=pk)
+    data = await db(lambda: view.get_serializer(rows[0]).data)
+    if key is None:
+        response = json_response(data)
+    else:
+        await db(store, key, data)
+        response = json_response(data, cache='MISS')
+    return set_validators(response, etag, last_modified)
+
+
+@async_read(FollowListAPIView.as_view())
+async def subscriptions(request):
+    user = await db(getattr, request, 'user')
+    if user.is_anonymous:
+        raise Fallback
+    view = FollowListAPIView(
+        request=request, format_kwarg=None, args=(), kwargs={}
+    )
+    rows = await paginate(view, view.get_queryset())
+    await db(
+        view.attach_recipes, rows, request.query_params.get('recipes_limit')
+    )
+    return json_response(await db(page_data, view, rows))
+
+
+tag_list = pooled(TagViewSet.as_view({'get': 'list'}))
+tag_detail = pooled(TagViewSet.as_view({'get': 'retrieve'}))
+ingredient_list = pooled(IngredientViewSet.as_view({'get': 'list'}))
+ingredient_detail = pooled(IngredientViewSet.as_view({'get': 'retrieve'}))
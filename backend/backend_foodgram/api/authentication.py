@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.models import DataVersion
+from recipes.relations import version_name
+from recipes.versions import bump_version, get_stamps
+from users.models import CustomUser
+
+TOKEN_VERSION_PREFIX = 'tokens:'
+
+
+def token_cache():
+    return caches[settings.TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    return f'token:{key}'
+
+
+def token_version_name(user_id):
+    return f'{TOKEN_VERSION_PREFIX}{user_id}'
+
+
+def forget_tokens(user_id, keys):
+    """Отзывает снимки токенов пользователя во всех процессах.
+
+    Локальный кеш чистится сразу, а снимки в кешах других воркеров
+    перестают совпадать с версией токенов пользователя в базе.
+    """
+    token_cache().delete_many([token_cache_key(key) for key in keys])
+    bump_version(token_version_name(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Токен-аутентификация со снимком пользователя в ограниченном кеше.
+
+    Счётчики и флаг ленты в снимок не попадают: они меняются без сигналов,
+    поэтому при обращении к ним пользователь догружается из базы. Снимок
+    действует, пока версия токенов пользователя в базе не изменилась;
+    её сверка читает заодно версию подписок для user_relations.
+    """
+
+    def load_token(self, key):
+        model = self.get_model()
+        version = DataVersion.objects.filter(name=Concat(
+            Value(TOKEN_VERSION_PREFIX),
+            Cast(OuterRef('user_id'), CharField())
+        )).values('version')
+        try:
+            return model.objects.select_related('user').defer(*(
+                f'user__{field}' for field in CustomUser.DENORMALIZED_FIELDS
+            )).annotate(
+                version=Coalesce(Subquery(version), 0)
+            ).get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def cached_token(self, key):
+        snapshot = token_cache().get(token_cache_key(key))
+        if snapshot is None:
+            return None
+        token, version = snapshot
+        tokens, relations = (
+            token_version_name(token.user_id), version_name(token.user_id)
+        )
+        stamps = get_stamps(tokens, relations)
+        if stamps[tokens][0] != version:
+            return None
+        token.user.relations_version = stamps[relations][0]
+        return token
+
+    def authenticate_credentials(self, key):
+        token = self.cached_token(key)
+        if token is None:
+            token = self.load_token(key)
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.')
+                )
+            token_cache().set(
+                token_cache_key(key), (token, token.version),
+                settings.TOKEN_CACHE_TIMEOUT
+            )
+        return token.user, token
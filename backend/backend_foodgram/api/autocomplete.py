@@ -0,0 +1,68 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+from django.db import connection
+
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+def normalize(name):
+    # Как UPPER в istartswith, которым отвечает запасной путь через SQL:
+    # выдача не должна зависеть от того, прогрет ли индекс.
+    return name.upper()
+
+
+class IngredientIndex:
+    """Отсортированный массив названий для поиска по префиксу в памяти."""
+
+    def __init__(self):
+        self.state = (None, [], [])
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version = get_version('ingredients')
+        rows = sorted(
+            (normalize(name), -pk, pk, name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        self.state = (
+            version,
+            [row[0] for row in rows],
+            [
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for _, _, pk, name, unit in rows
+            ]
+        )
+
+    def refresh_in_background(self):
+        if not self.lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                connection.close()
+                self.lock.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def search(self, prefix, current_version=None):
+        if current_version is None:
+            current_version = get_version('ingredients')
+        version, keys, items = self.state
+        if version is None or version != current_version:
+            self.refresh_in_background()
+            return None
+        prefix = normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = bisect_right(keys, prefix + MAX_CHAR, lo=start)
+        return sorted(items[start:end], key=lambda item: -item['id'])
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,117 @@
+from hashlib import md5
+
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from recipes.models import Recipe
+from recipes.relations import user_relations
+from recipes.versions import get_stamps
+from .response_cache import generations
+
+
+def make_etag(*parts):
+    return quote_etag(md5(repr(parts).encode()).hexdigest())
+
+
+def not_modified(request, etag, last_modified):
+    return get_conditional_response(
+        request, etag=etag,
+        last_modified=None if last_modified is None else int(last_modified)
+    )
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def conditional(request, etag, last_modified, render):
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    return set_validators(render(), etag, last_modified)
+
+
+def catalog_stamp(request, catalog):
+    """Отметка справочника, прочитанная один раз за запрос."""
+    stamps = getattr(request, 'catalog_stamps', None)
+    if stamps is None:
+        stamps = request.catalog_stamps = {}
+    if catalog not in stamps:
+        stamps[catalog] = get_stamps(catalog)[catalog]
+    return stamps[catalog]
+
+
+def catalog_validators(request, catalog):
+    version, modified = catalog_stamp(request, catalog)
+    return make_etag(catalog, version, request.get_full_path()), modified
+
+
+class CatalogConditionalMixin:
+    """ETag и Last-Modified для справочников по их общей отметке изменений."""
+
+    catalog = None
+
+    def catalog_conditional(self, request, render):
+        return conditional(
+            request, *catalog_validators(request, self.catalog), render
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_conditional(
+            request, lambda: super(CatalogConditionalMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_conditional(
+            request, lambda: super(CatalogConditionalMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
+
+
+def recipe_validators(request, pk):
+    try:
+        state = Recipe.objects.filter(pk=pk).values_list(
+            'id', 'updated_at', 'author_id', 'author__email',
+            'author__username', 'author__first_name', 'author__last_name',
+            'favorites_count', 'in_carts_count', 'author__recipes_count',
+            'author__followers_count'
+        ).first()
+    except (TypeError, ValueError):
+        state = None
+    if state is None:
+        raise Http404
+    recipe_id, updated_at, author_id = state[:3]
+    relations = user_relations(request.user)
+    flags = relations and (
+        recipe_id in relations.favorites,
+        recipe_id in relations.shopping_cart,
+        author_id in relations.following,
+    )
+    stamps = generations(request)
+    catalogs = [stamps['tags'], stamps['ingredients']]
+    etag = make_etag(
+        'recipe', request.user.pk, state, flags,
+        *(version for version, _ in catalogs)
+    )
+    last_modified = None
+    if request.user.is_anonymous:
+        # Счётчики в ETag уже есть, а для If-Modified-Since их изменение
+        # видно только по отметке поколения 'counters'.
+        last_modified = max(
+            updated_at.timestamp(),
+            *(modified for _, modified in catalogs + [stamps['counters']]
+              if modified)
+        )
+    return etag, last_modified
+
+
+def recipe_conditional(request, pk, render):
+    return conditional(request, *recipe_validators(request, pk), render)
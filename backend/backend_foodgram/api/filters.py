@@ -1,7 +1,12 @@
 from django.contrib import admin
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes import ingredient_sets, search
+from recipes.models import Ingredient, IngredientQuantity, Recipe, Tag
 
 
 class IngredientFilter(FilterSet):
@@ -15,6 +20,21 @@ class IngredientFilter(FilterSet):
         fields = ('name',)
 
 
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
+class StableOrderingFilter(filters.OrderingFilter):
+    """Сортировка по счётчикам с -id для однозначного порядка страниц."""
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.order_by(
+            *(self.get_ordering_value(param) for param in value), '-id'
+        )
+
+
 class UserRecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
@@ -27,6 +47,12 @@ class UserRecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    exclude_ingredients = NumberInFilter(method='filter_exclude_ingredients')
+    ordering = StableOrderingFilter(
+        fields=('favorites_count', 'in_carts_count')
+    )
 
     class Meta:
         model = Recipe
@@ -46,6 +72,40 @@ class UserRecipeFilter(FilterSet):
             )
         return queryset
 
+    def filter_ingredients(self, queryset, name, value):
+        return ingredient_sets.filter_recipes(
+            queryset, include=[int(pk) for pk in value]
+        )
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        return ingredient_sets.filter_recipes(
+            queryset, exclude=[int(pk) for pk in value]
+        )
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        if not search.enabled():
+            return queryset.filter(
+                Q(name__icontains=value)
+                | Q(text__icontains=value)
+                | Q(id__in=IngredientQuantity.objects.filter(
+                    ingredient__name__icontains=value
+                ).values('recipe_id'))
+            )
+        query = SearchQuery(
+            value, config=search.SEARCH_CONFIG, search_type='websearch'
+        )
+        matches = Q(search_vector=query)
+        rank = SearchRank(F('search_vector'), query)
+        if search.trigram_enabled():
+            matches |= Q(name__trigram_similar=value)
+            rank += TrigramSimilarity('name', value)
+        return queryset.filter(matches).annotate(
+            search_rank=Cast(rank, FloatField())
+        ).order_by('-search_rank', '-id')
+
 
 class IngredientFilterAdmin(admin.SimpleListFilter):
 
@@ -0,0 +1,173 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.seeding import SEED_PASSWORD
+
+DEFAULT_MIX = 'browse=5,filter=2,subscriptions=1,catalog=2'
+
+
+def process_tree(pid):
+    pids = [pid]
+    for child in Path(f'/proc/{pid}/task/{pid}/children').read_text().split():
+        pids.extend(process_tree(int(child)))
+    return pids
+
+
+def rss_mb(pid):
+    """Суммарная резидентная память процесса и всех его потомков."""
+    total = 0
+    for child in process_tree(pid):
+        try:
+            status = Path(f'/proc/{child}/status').read_text()
+        except FileNotFoundError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1])
+    return round(total / 1024, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает gunicorn с WSGI и с ASGI (uvicorn) на одной базе, '
+        'нагружает оба чтением через load_test и сравнивает запросы '
+        'в секунду, p99 и занятую процессами память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wsgi-workers', type=int, default=4,
+            help='Синхронных воркеров gunicorn.'
+        )
+        parser.add_argument(
+            '--asgi-workers', type=int, default=2,
+            help='Воркеров uvicorn; подберите так, чтобы память совпадала.'
+        )
+        parser.add_argument('--clients', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--warmup', type=float, default=5)
+        parser.add_argument('--mix', default=DEFAULT_MIX)
+        parser.add_argument('--port', type=int, default=8300)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс пользователей, созданных seed_foodgram.'
+        )
+        parser.add_argument('--password', default=SEED_PASSWORD)
+        parser.add_argument('--output', help='Файл для отчёта.')
+
+    def deployments(self, options):
+        gunicorn = [sys.executable, '-m', 'gunicorn']
+        return {
+            'wsgi': (
+                options['wsgi_workers'],
+                {'ASYNC_READ_VIEWS': 'False'},
+                gunicorn + [
+                    'backend_foodgram.wsgi:application',
+                    '--workers', str(options['wsgi_workers']),
+                ],
+            ),
+            'asgi': (
+                options['asgi_workers'],
+                {'ASYNC_READ_VIEWS': 'True'},
+                gunicorn + [
+                    'backend_foodgram.asgi:application',
+                    '--worker-class', 'uvicorn.workers.UvicornWorker',
+                    '--workers', str(options['asgi_workers']),
+                ],
+            ),
+        }
+
+    def wait_ready(self, url, server):
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(
+                    f'Сервер завершился с кодом {server.returncode}.'
+                )
+            try:
+                if requests.get(f'{url}/api/tags/', timeout=5).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise CommandError(f'{url} не ответил за 60 секунд.')
+
+    def load(self, url, duration, options):
+        output = StringIO()
+        call_command(
+            'load_test', url=url, clients=options['clients'],
+            duration=duration, mix=options['mix'],
+            prefix=options['prefix'], password=options['password'],
+            stdout=output
+        )
+        return json.loads(output.getvalue())
+
+    def run(self, workers, env, command, options):
+        url = f'http://127.0.0.1:{options["port"]}'
+        server = subprocess.Popen(
+            command + ['--bind', f'127.0.0.1:{options["port"]}'],
+            cwd=settings.BASE_DIR, env={**os.environ, **env},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        peak = 0
+        measuring = threading.Event()
+        try:
+            self.wait_ready(url, server)
+            self.load(url, options['warmup'], options)
+            measuring.set()
+
+            def sample():
+                nonlocal peak
+                while measuring.is_set():
+                    peak = max(peak, rss_mb(server.pid))
+                    time.sleep(0.5)
+
+            sampler = threading.Thread(target=sample)
+            sampler.start()
+            report = self.load(url, options['duration'], options)
+        finally:
+            measuring.clear()
+            server.terminate()
+            server.wait()
+        sampler.join()
+        return {
+            'workers': workers,
+            'rss_mb': peak,
+            'requests': report['requests'],
+            'errors': report['errors'],
+            'throughput_rps': report['throughput_rps'],
+            'p50_ms': report['p50_ms'],
+            'p99_ms': report['p99_ms'],
+            'rps_per_gb': round(report['throughput_rps'] / peak * 1024, 1),
+        }
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, (workers, env, command) in self.deployments(
+            options
+        ).items():
+            self.stderr.write(f'{name}: {workers} воркеров...')
+            results[name] = self.run(workers, env, command, options)
+        output = json.dumps({
+            'config': {
+                'clients': options['clients'],
+                'duration_s': options['duration'],
+                'mix': options['mix'],
+            },
+            **results,
+        }, ensure_ascii=False, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
@@ -0,0 +1,143 @@
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from drf_extra_fields.fields import Base64ImageField as BufferedImageField
+from PIL import Image
+from rest_framework.parsers import JSONParser
+
+from api.uploads import Base64ImageField, Base64ImageJSONParser
+
+MODES = ('streaming', 'buffered')
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+    return pages * resource.getpagesize() // 1024
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.baseline = self.peak = current_rss()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak - self.baseline
+
+
+def write_payload(path, size):
+    side = int((size * 3 / 4 / 3) ** 0.5)
+    image = Image.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=1)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    with open(path, 'w') as payload:
+        json.dump({
+            'name': 'Тест', 'text': 'Тест', 'cooking_time': 1,
+            'image': 'data:image/png;base64,' + encoded,
+        }, payload)
+
+
+def streaming_upload(path):
+    with open(path, 'rb') as stream:
+        data = Base64ImageJSONParser().parse(stream, parser_context={})
+    return Base64ImageField().to_internal_value(data['image'])
+
+
+def buffered_upload(path):
+    with open(path, 'rb') as stream:
+        data = JSONParser().parse(stream, parser_context={})
+    return BufferedImageField().to_internal_value(data['image'])
+
+
+UPLOADS = {'streaming': streaming_upload, 'buffered': buffered_upload}
+
+
+class Command(BaseCommand):
+    help = ('Измеряет пиковое потребление памяти при параллельной загрузке '
+            'изображений в base64.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=10)
+        parser.add_argument('--size-mb', type=int, default=10)
+        parser.add_argument('--mode', choices=MODES)
+        parser.add_argument('--payload')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            if not options['payload']:
+                raise CommandError('Для --mode нужен --payload.')
+            self.run_mode(options['mode'], options['payload'],
+                          options['uploads'])
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'payload.json')
+            write_payload(path, options['size_mb'] * 1024 * 1024)
+            self.stdout.write(
+                f'Тело запроса: {os.path.getsize(path) / 2 ** 20:.1f} МБ, '
+                f'загрузок: {options["uploads"]}'
+            )
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, sys.argv[0], 'bench_image_upload',
+                     '--mode', mode, '--payload', path,
+                     '--uploads', str(options['uploads'])],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output)
+                self.stdout.write(
+                    f'{mode:>9}: пик RSS +{result["peak_kb"] / 1024:7.1f} МБ,'
+                    f' {result["seconds"]:.2f} с'
+                )
+
+    def run_mode(self, mode, path, uploads):
+        upload = UPLOADS[mode]
+        barrier = threading.Barrier(uploads)
+        errors = []
+
+        def worker():
+            barrier.wait()
+            try:
+                image = upload(path)
+                for chunk in image.chunks():
+                    pass
+                barrier.wait()
+                image.close()
+            except Exception as error:
+                errors.append(error)
+                barrier.abort()
+
+        sampler = RssSampler()
+        sampler.start()
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(uploads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+        peak_kb = sampler.stop()
+        if errors:
+            raise CommandError(repr(errors[0]))
+        self.stdout.write(json.dumps({'peak_kb': peak_kb, 'seconds': seconds}))
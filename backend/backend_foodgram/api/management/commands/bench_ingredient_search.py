@@ -0,0 +1,51 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.autocomplete import IngredientIndex
+from api.serializers import IngredientSerializer
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поиск ингредиентов по префиксу: SQL и индекс в памяти.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError(
+                'Нет ингредиентов, сначала выполните load_ingredients.'
+            )
+        generator = random.Random(options['seed'])
+        prefixes = [
+            name[:generator.randint(1, 3)]
+            for name in generator.choices(names, k=options['queries'])
+        ]
+        index = IngredientIndex()
+        started = time.perf_counter()
+        index.refresh()
+        build_time = time.perf_counter() - started
+
+        def sql_search(prefix):
+            return IngredientSerializer(
+                Ingredient.objects.filter(name__istartswith=prefix),
+                many=True
+            ).data
+
+        for label, search in (('sql', sql_search), ('index', index.search)):
+            started = time.perf_counter()
+            found = sum(len(search(prefix)) for prefix in prefixes)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label:>5}: {elapsed / len(prefixes) * 1e6:9.1f} мкс/запрос,'
+                f' найдено {found}'
+            )
+        self.stdout.write(
+            f'Построение индекса: {build_time * 1e3:.1f} мс, '
+            f'{len(names)} названий'
+        )
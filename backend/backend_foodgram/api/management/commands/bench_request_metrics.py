@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from api.metrics import registry
+
+DEFAULT_PATHS = ('/api/tags/', '/api/ingredients/?name=а', '/api/recipes/')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время ответа с метриками запросов и без них '
+            'и проверяет бюджет накладных расходов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=25)
+        parser.add_argument(
+            '--budget', type=float, default=100,
+            help='Допустимые накладные расходы на запрос, мкс.'
+        )
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+
+    def make_client(self, enabled, path):
+        with override_settings(REQUEST_METRICS=enabled,
+                               REQUEST_METRICS_SERVER_TIMING=enabled,
+                               ALLOWED_HOSTS=['*']):
+            client = Client()
+            response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: ответ {response.status_code}')
+        return client
+
+    def measure(self, client, path, requests):
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        return (time.perf_counter() - started) / requests
+
+    def handle(self, *args, **options):
+        exceeded = []
+        for path in options['paths']:
+            clients = {
+                enabled: self.make_client(enabled, path)
+                for enabled in (False, True)
+            }
+            timings = {False: [], True: []}
+            for _ in range(options['rounds']):
+                for enabled, client in clients.items():
+                    timings[enabled].append(
+                        self.measure(client, path, options['requests'])
+                    )
+            plain = statistics.median(timings[False])
+            measured = statistics.median(timings[True])
+            overhead = (measured - plain) * 1e6
+            self.stdout.write(
+                f'{path}: без метрик {plain * 1e6:.0f} мкс, '
+                f'с метриками {measured * 1e6:.0f} мкс, '
+                f'накладные расходы {overhead:+.0f} мкс '
+                f'({overhead / plain / 1e4:+.1f}%)'
+            )
+            if overhead > options['budget']:
+                exceeded.append(path)
+        registry.clear()
+        if exceeded:
+            raise CommandError(
+                'Превышен бюджет {} мкс: {}'.format(
+                    options['budget'], ', '.join(exceeded)
+                )
+            )
@@ -0,0 +1,237 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.seeding import SEED_PASSWORD
+
+SCENARIOS = (
+    'browse', 'filter', 'favorite', 'cart', 'subscriptions', 'catalog'
+)
+DEFAULT_MIX = 'browse=5,filter=2,favorite=1,cart=1,subscriptions=1'
+
+
+def percentile(values, share):
+    index = max(0, min(len(values) - 1, round(share * len(values)) - 1))
+    return values[index]
+
+
+class VirtualUser:
+    """Один клиент со своей сессией, выполняющий сценарии по очереди."""
+
+    def __init__(self, base_url, token, recipe_ids, tags, generator):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Token {token}'
+        self.recipe_ids = recipe_ids
+        self.tags = tags
+        self.generator = generator
+        self.samples = []
+
+    def request(self, label, method, path, expected, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, timeout=30, **kwargs
+            )
+            ok = response.status_code in expected
+            response.content
+        except requests.RequestException:
+            ok = False
+        self.samples.append((label, time.perf_counter() - started, ok))
+
+    def browse(self):
+        self.request(
+            'recipes-list', 'get',
+            f'/api/recipes/?page={self.generator.randint(1, 20)}', (200,)
+        )
+        self.request(
+            'recipes-detail', 'get',
+            f'/api/recipes/{self.generator.choice(self.recipe_ids)}/',
+            (200,)
+        )
+
+    def filter(self):
+        tags = self.generator.sample(
+            self.tags, self.generator.randint(1, len(self.tags))
+        )
+        self.request(
+            'recipes-filter', 'get',
+            '/api/recipes/?' + '&'.join(f'tags={tag}' for tag in tags),
+            (200,)
+        )
+
+    def favorite(self):
+        recipe_id = self.generator.choice(self.recipe_ids)
+        path = f'/api/recipes/{recipe_id}/favorite/'
+        self.request('favorite-add', 'post', path, (201, 400))
+        self.request('favorite-remove', 'delete', path, (204,))
+
+    def cart(self):
+        recipe_id = self.generator.choice(self.recipe_ids)
+        path = f'/api/recipes/{recipe_id}/shopping_cart/'
+        self.request('cart-add', 'post', path, (201, 400))
+        self.request(
+            'cart-download', 'get', '/api/recipes/download_shopping_cart/',
+            (200,)
+        )
+        self.request('cart-remove', 'delete', path, (204,))
+
+    def subscriptions(self):
+        self.request(
+            'subscriptions', 'get',
+            '/api/users/subscriptions/?recipes_limit=3', (200,)
+        )
+
+    def catalog(self):
+        self.request('tags', 'get', '/api/tags/', (200,))
+        self.request(
+            'ingredients-search', 'get',
+            f'/api/ingredients/?name={self.generator.choice("абвгкмпс")}',
+            (200,)
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает запущенный сервер сценариями просмотра, фильтрации, '
+        'избранного, корзины и подписок и выводит отчёт в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--clients', type=int, default=10,
+            help='Число одновременных клиентов.'
+        )
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help='Веса сценариев: ' + ', '.join(SCENARIOS) + '.'
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс пользователей, созданных seed_foodgram.'
+        )
+        parser.add_argument('--password', default=SEED_PASSWORD)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчёта.')
+
+    def parse_mix(self, mix):
+        weights = {}
+        for part in mix.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in SCENARIOS:
+                raise CommandError(f'Неизвестный сценарий: {name}')
+            weights[name] = float(weight or 1)
+        return weights
+
+    def login(self, base_url, number, prefix, password):
+        response = requests.post(
+            f'{base_url}/api/auth/token/login/',
+            json={'email': f'{prefix}{number}@example.com',
+                  'password': password},
+            timeout=30
+        )
+        if response.status_code != 200:
+            raise CommandError(
+                f'Не удалось войти как {prefix}{number}: '
+                f'{response.status_code}. Сначала выполните seed_foodgram.'
+            )
+        return response.json()['auth_token']
+
+    def handle(self, *args, **options):
+        base_url = options['url'].rstrip('/')
+        weights = self.parse_mix(options['mix'])
+        catalog = requests.get(
+            f'{base_url}/api/recipes/?limit=100', timeout=30
+        ).json()
+        recipe_ids = [recipe['id'] for recipe in catalog['results']]
+        tags = [
+            tag['slug'] for tag in requests.get(
+                f'{base_url}/api/tags/', timeout=30
+            ).json()
+        ]
+        if not recipe_ids or not tags:
+            raise CommandError(
+                'Нет рецептов или тегов, сначала выполните seed_foodgram.'
+            )
+        users = [
+            VirtualUser(
+                base_url,
+                self.login(base_url, number, options['prefix'],
+                           options['password']),
+                recipe_ids, tags,
+                random.Random(options['seed'] + number)
+            )
+            for number in range(options['clients'])
+        ]
+        deadline = time.monotonic() + options['duration']
+
+        def run(user):
+            scenarios = [getattr(user, name) for name in weights]
+            while time.monotonic() < deadline:
+                user.generator.choices(
+                    scenarios, weights=list(weights.values())
+                )[0]()
+
+        threads = [
+            threading.Thread(target=run, args=(user,)) for user in users
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        report = self.report(users, elapsed, options, weights)
+        output = json.dumps(report, ensure_ascii=False, indent=2,
+                            sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def report(self, users, elapsed, options, weights):
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        for user in users:
+            for label, seconds, ok in user.samples:
+                timings[label].append(seconds)
+                errors[label] += not ok
+        endpoints = {}
+        for label, values in timings.items():
+            values.sort()
+            endpoints[label] = {
+                'requests': len(values),
+                'errors': errors[label],
+                'throughput_rps': round(len(values) / elapsed, 2),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            }
+        total = sum(len(values) for values in timings.values())
+        overall = sorted(
+            seconds for values in timings.values() for seconds in values
+        )
+        return {
+            'config': {
+                'url': options['url'],
+                'clients': options['clients'],
+                'duration_s': options['duration'],
+                'mix': weights,
+            },
+            'elapsed_s': round(elapsed, 2),
+            'requests': total,
+            'errors': sum(errors.values()),
+            'throughput_rps': round(total / elapsed, 2),
+            'p50_ms': round(percentile(overall, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(overall, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(overall, 0.99) * 1000, 2),
+            'endpoints': endpoints,
+        }
@@ -0,0 +1,193 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import counters
+from recipes.seeding import SEED_PASSWORD
+from .load_test import percentile
+
+EXPECTED = {'post': (201, 400), 'delete': (204, 404)}
+
+
+class Racer:
+    """Клиент, повторяющий те же переключения, что и его двойник.
+
+    Двойники одного пользователя получают одинаковый генератор, поэтому
+    одновременно жмут одну и ту же кнопку — как при двойном клике.
+    """
+
+    def __init__(self, base_url, token, user_id, recipe_ids, author_ids,
+                 seed):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Token {token}'
+        self.author_ids = [pk for pk in author_ids if pk != user_id]
+        self.recipe_ids = recipe_ids
+        self.generator = random.Random(seed)
+        self.samples = []
+
+    def toggle(self):
+        kind = self.generator.choice(('favorite', 'cart', 'subscribe'))
+        method = self.generator.choice(('post', 'delete'))
+        if kind == 'subscribe':
+            path = (
+                f'/api/users/{self.generator.choice(self.author_ids)}'
+                '/subscribe/'
+            )
+        else:
+            url_path = 'favorite' if kind == 'favorite' else 'shopping_cart'
+            path = (
+                f'/api/recipes/{self.generator.choice(self.recipe_ids)}'
+                f'/{url_path}/'
+            )
+        started = time.perf_counter()
+        try:
+            code = self.session.request(
+                method, self.base_url + path, timeout=30
+            ).status_code
+        except requests.RequestException:
+            code = None
+        self.samples.append(
+            (f'{kind}-{method}', time.perf_counter() - started, code)
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Одновременно переключает избранное, корзину и подписки парами '
+        'клиентов одного пользователя на нескольких популярных целях, '
+        'выводит отчёт в JSON и сверяет счётчики.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--users', type=int, default=10,
+            help='Число пользователей.'
+        )
+        parser.add_argument(
+            '--racers', type=int, default=2,
+            help='Одновременных клиентов на пользователя.'
+        )
+        parser.add_argument(
+            '--targets', type=int, default=5,
+            help='Число рецептов и авторов, на которых идёт гонка.'
+        )
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс пользователей, созданных seed_foodgram.'
+        )
+        parser.add_argument('--password', default=SEED_PASSWORD)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчёта.')
+
+    def login(self, base_url, number, prefix, password):
+        response = requests.post(
+            f'{base_url}/api/auth/token/login/',
+            json={'email': f'{prefix}{number}@example.com',
+                  'password': password},
+            timeout=30
+        )
+        if response.status_code != 200:
+            raise CommandError(
+                f'Не удалось войти как {prefix}{number}: '
+                f'{response.status_code}. Сначала выполните seed_foodgram.'
+            )
+        token = response.json()['auth_token']
+        user_id = requests.get(
+            f'{base_url}/api/users/me/',
+            headers={'Authorization': f'Token {token}'}, timeout=30
+        ).json()['id']
+        return token, user_id
+
+    def handle(self, *args, **options):
+        base_url = options['url'].rstrip('/')
+        catalog = requests.get(
+            f'{base_url}/api/recipes/?limit={options["targets"] * 10}',
+            timeout=30
+        ).json()['results']
+        recipe_ids = [recipe['id'] for recipe in catalog][
+            :options['targets']
+        ]
+        author_ids = list(dict.fromkeys(
+            recipe['author']['id'] for recipe in catalog
+        ))[:options['targets'] + 1]
+        if not recipe_ids or len(author_ids) < 2:
+            raise CommandError(
+                'Нет рецептов или авторов, сначала выполните seed_foodgram.'
+            )
+        racers = []
+        for number in range(options['users']):
+            token, user_id = self.login(
+                base_url, number, options['prefix'], options['password']
+            )
+            racers.extend(
+                Racer(base_url, token, user_id, recipe_ids, author_ids,
+                      options['seed'] + number)
+                for _ in range(options['racers'])
+            )
+        deadline = time.monotonic() + options['duration']
+
+        def run(racer):
+            while time.monotonic() < deadline:
+                racer.toggle()
+
+        threads = [
+            threading.Thread(target=run, args=(racer,)) for racer in racers
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        report = self.report(racers, elapsed, options)
+        output = json.dumps(report, ensure_ascii=False, indent=2,
+                            sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def report(self, racers, elapsed, options):
+        timings = defaultdict(list)
+        codes = defaultdict(Counter)
+        errors = defaultdict(int)
+        for racer in racers:
+            for label, seconds, code in racer.samples:
+                timings[label].append(seconds)
+                codes[label][str(code)] += 1
+                errors[label] += code not in EXPECTED[label.split('-')[1]]
+        endpoints = {}
+        for label, values in timings.items():
+            values.sort()
+            endpoints[label] = {
+                'requests': len(values),
+                'statuses': dict(codes[label]),
+                'errors': errors[label],
+                'throughput_rps': round(len(values) / elapsed, 2),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            }
+        total = sum(len(values) for values in timings.values())
+        return {
+            'config': {
+                'url': options['url'],
+                'users': options['users'],
+                'racers': options['racers'],
+                'targets': options['targets'],
+                'duration_s': options['duration'],
+            },
+            'elapsed_s': round(elapsed, 2),
+            'requests': total,
+            'errors': sum(errors.values()),
+            'throughput_rps': round(total / elapsed, 2),
+            'endpoints': endpoints,
+            'counter_drift': counters.recount(dry_run=True),
+        }
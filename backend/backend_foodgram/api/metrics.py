@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+SECONDS_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+METRICS = {
+    'request_duration_seconds': (
+        'Время обработки запроса.', SECONDS_BUCKETS
+    ),
+    'db_duration_seconds': ('Время запросов к БД.', SECONDS_BUCKETS),
+    'db_queries': ('Число запросов к БД.', QUERY_BUCKETS),
+    'render_duration_seconds': (
+        'Время сериализации ответа рендерером.', SECONDS_BUCKETS
+    ),
+}
+PREFIX = 'foodgram_'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Гистограммы по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, view, values):
+        with self.lock:
+            for metric, value in values.items():
+                histogram = self.histograms.get((metric, view))
+                if histogram is None:
+                    histogram = self.histograms[metric, view] = Histogram(
+                        METRICS[metric][1]
+                    )
+                histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render(self):
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            for metric, (description, buckets) in METRICS.items():
+                name = PREFIX + metric
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (histogram_metric, view), histogram in histograms:
+                    if histogram_metric != metric:
+                        continue
+                    label = view.replace('\\', '\\\\').replace('"', '\\"')
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f'{name}_bucket{{view="{label}",le="{bound}"}} '
+                            f'{cumulative}'
+                        )
+                    lines.append(
+                        f'{name}_bucket{{view="{label}",le="+Inf"}} '
+                        f'{histogram.count}'
+                    )
+                    lines.append(
+                        f'{name}_sum{{view="{label}"}} {histogram.sum}'
+                    )
+                    lines.append(
+                        f'{name}_count{{view="{label}"}} {histogram.count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    __slots__ = ('count', 'duration', 'lock')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # Асинхронные представления шлют запросы из нескольких потоков.
+            with self.lock:
+                self.duration += time.perf_counter() - started
+                self.count += 1
+
+
+current_timer = ContextVar('current_timer', default=None)
+
+
+def timed_execute(execute, sql, params, many, context):
+    """Обёртка каждого соединения: пишет запрос в таймер текущего запроса.
+
+    Таймер передаётся через contextvar, а sync_to_async копирует контекст
+    в потоки, поэтому учитываются и запросы из пула потоков БД.
+    """
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_timer(connection):
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_execute)
+
+
+class RequestMetricsMiddleware:
+    """Считает запросы к БД и время ответа по каждому представлению."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = settings.REQUEST_METRICS_SERVER_TIMING
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        reset = current_timer.set(timer)
+        request.render_duration = 0
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(reset)
+        return self.observe(request, response, timer, started)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        reset = current_timer.set(timer)
+        request.render_duration = 0
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(reset)
+        return self.observe(request, response, timer, started)
+
+    def observe(self, request, response, timer, started):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe(view, {
+            'request_duration_seconds': duration,
+            'db_duration_seconds': timer.duration,
+            'db_queries': timer.count,
+            'render_duration_seconds': request.render_duration,
+        })
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={timer.duration * 1000:.1f};'
+                f'desc="{timer.count} queries", '
+                f'render;dur={request.render_duration * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.render_duration = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
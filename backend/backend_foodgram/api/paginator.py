@@ -1,6 +1,44 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class PageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+SEARCH_ORDERING = ('-search_rank', '-id')
+
+
+class IdCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        # Курсор помнит значение ключа сортировки, поэтому ключ не должен
+        # меняться между страницами: счётчики из ?ordering= меняются
+        # и дают пропуски и повторы. Кроме -id сохраняем только ранг поиска.
+        ordering = tuple(queryset.query.order_by)
+        if ordering == SEARCH_ORDERING:
+            return ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """Постраничная пагинация, а при наличии ?cursor= — по ключу -id."""
+
+    cursor_pagination_class = IdCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if IdCursorPagination.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
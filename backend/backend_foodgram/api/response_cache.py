@@ -0,0 +1,82 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from recipes.versions import get_stamps
+
+GENERATIONS = ('recipes', 'tags', 'ingredients', 'users', 'counters')
+STATS_KEYS = {'hit': 'recipes-cache:hits', 'miss': 'recipes-cache:misses'}
+
+
+def response_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def count(event):
+    cache = response_cache()
+    key = STATS_KEYS[event]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def cache_stats():
+    values = response_cache().get_many(STATS_KEYS.values())
+    return {
+        event: values.get(key, 0) for event, key in STATS_KEYS.items()
+    }
+
+
+def generations(request):
+    """Отметки GENERATIONS из базы, прочитанные один раз за запрос."""
+    stamps = getattr(request, 'generations', None)
+    if stamps is None:
+        stamps = request.generations = get_stamps(*GENERATIONS)
+    return stamps
+
+
+def cache_key(request):
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    )
+    versions = [version for version, _ in generations(request).values()]
+    digest = md5(
+        repr((request.get_host(), request.path, params)).encode()
+    ).hexdigest()
+    return 'recipes-cache:{}:{}'.format(
+        '.'.join(map(str, versions)), digest
+    )
+
+
+def cached_data(key):
+    data = response_cache().get(key)
+    count('miss' if data is None else 'hit')
+    return data
+
+
+def store(key, data):
+    response_cache().set(key, data, settings.RECIPE_CACHE_TIMEOUT)
+
+
+class AnonymousResponseCacheMixin:
+    """Кеширует ответы анонимным пользователям до смены поколений данных."""
+
+    def cached_response(self, request, render):
+        if not request.user.is_anonymous:
+            return render()
+        key = cache_key(request)
+        data = cached_data(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = render()
+        if response.status_code == 200:
+            store(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
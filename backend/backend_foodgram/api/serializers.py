@@ -1,12 +1,15 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
-                            ShoppingCart, Tag)
-from users.models import CustomUser, Follow
+from recipes import bulk, cart_totals, search
+from recipes.images import enqueue_variants, existing_variants
+from recipes.models import Ingredient, IngredientQuantity, Recipe, Tag
+from recipes.relations import user_relations
+from users.models import CustomUser
+from .uploads import Base64ImageField
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -26,82 +29,75 @@ class CustomUserSerializer(UserSerializer):
         model = CustomUser
         fields = (
             'id', 'email', 'username', 'first_name',
-            'last_name', 'is_subscribed'
+            'last_name', 'is_subscribed', 'recipes_count', 'followers_count'
         )
+        read_only_fields = ('recipes_count', 'followers_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return Follow.objects.filter(
-            user=request.user, following=obj
-        ).exists()
+        return obj.id in user_relations(request.user).following
 
 
-class FollowSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Follow
-        fields = ('user', 'following')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'following'),
-                message=('Вы уже подписаны на данного пользователя!')
-            )
-        ]
-
-    def validate(self, data):
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, variants):
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        following = data['following']
-        if request.user == following:
-            raise serializers.ValidationError(
-                'Вы не можете подписаться на себя!'
-            )
-        return data
+        urls = {}
+        for variant, names in variants.items():
+            urls[variant] = {}
+            for extension, name in names.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][extension] = url
+        return urls
 
 
 class FollowRecipesSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class FollowListSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = CustomUser
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count')
+                  'is_subscribed', 'recipes', 'recipes_count',
+                  'followers_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return Follow.objects.filter(
-            user=request.user, following=obj
-        ).exists()
+        return obj.id in user_relations(request.user).following
 
     def get_recipes(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
         context = {'request': request}
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit is not None:
-            recipes = obj.recipes.all()[:int(recipes_limit)]
+        if hasattr(obj, 'page_recipes'):
+            recipes = obj.page_recipes
         else:
-            recipes = obj.recipes.all()
+            recipes_limit = request.query_params.get('recipes_limit')
+            if recipes_limit is not None:
+                recipes = obj.recipes.all()[:int(recipes_limit)]
+            else:
+                recipes = obj.recipes.all()
         return FollowRecipesSerializer(
             recipes, many=True, context=context).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -122,9 +118,7 @@ class IngredientQuantitySerializer(serializers.ModelSerializer):
 
 
 class IngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -151,30 +145,31 @@ class RecipeListSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField(read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time', 'favorites_count', 'in_carts_count'
         )
-    
+
     def get_ingredients(self, obj):
-        ingredients = IngredientQuantity.objects.filter(recipe=obj)
+        ingredients = obj.ingredientquantity_set.all()
         return IngredientQuantitySerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return Favorite.objects.filter(user=request.user, recipe=obj).exists()
+        return obj.id in user_relations(request.user).favorites
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return ShoppingCart.objects.filter(
-            user=request.user, recipe=obj).exists()
+        return obj.id in user_relations(request.user).shopping_cart
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -233,39 +228,124 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         return data
 
+    def validate_ingredients(self, ingredients):
+        ingredient_ids = {ingredient['id'] for ingredient in ingredients}
+        missing = ingredient_ids - set(Ingredient.objects.filter(
+            id__in=ingredient_ids
+        ).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                + ', '.join(str(pk) for pk in sorted(missing))
+            )
+        return ingredients
+
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            amount = ingredient['amount']
-            IngredientQuantity.objects.create(
-                recipe=recipe, ingredient=ingredient_id, amount=amount
+        IngredientQuantity.objects.bulk_create(
+            IngredientQuantity(
+                recipe=recipe,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
             )
+            for ingredient in ingredients
+        )
 
-    def create_tags(self, tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
-    
+    def update_ingredients(self, ingredients, recipe):
+        existing = {
+            quantity.ingredient_id: quantity
+            for quantity in IngredientQuantity.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        deltas = {}
+        changed = []
+        for ingredient_id, quantity in existing.items():
+            amount = amounts.get(ingredient_id, 0)
+            if amount != quantity.amount:
+                deltas[ingredient_id] = amount - quantity.amount
+                quantity.amount = amount
+                changed.append(quantity)
+        removed = [
+            quantity.id for quantity in changed if not quantity.amount
+        ]
+        changed = [quantity for quantity in changed if quantity.amount]
+        if removed:
+            bulk.delete_ingredients(recipe.id, removed)
+        IngredientQuantity.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(
+            [
+                ingredient for ingredient in ingredients
+                if ingredient['id'] not in existing
+            ],
+            recipe
+        )
+        for ingredient_id, amount in amounts.items():
+            if ingredient_id not in existing:
+                deltas[ingredient_id] = amount
+        cart_totals.change_ingredients(recipe.id, deltas)
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_tags(tags, recipe)
+        recipe = Recipe(
+            author=author,
+            ingredient_ids=self.ingredient_ids(ingredients),
+            **validated_data
+        )
+        recipe.image_variants = existing_variants(
+            self.image_name(recipe, validated_data['image'])
+        )
+        recipe.save()
+        recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        search.update_vectors([recipe.id])
+        if not recipe.image_variants:
+            self.enqueue_image_variants(recipe)
         return recipe
-    
+
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        recipe.tags.clear()
-        IngredientQuantity.objects.filter(recipe=recipe).all().delete()
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        self.create_tags(tags, recipe)
-        self.create_ingredients(ingredients, recipe)
-        return super().update(recipe, validated_data)
+        recipe.tags.set(tags)
+        self.update_ingredients(ingredients, recipe)
+        recipe.ingredient_ids = self.ingredient_ids(ingredients)
+        image = validated_data.get('image')
+        if image is None:
+            return super().update(recipe, validated_data)
+        image_name = self.image_name(recipe, image)
+        if image_name == recipe.image.name:
+            validated_data.pop('image')
+            return super().update(recipe, validated_data)
+        recipe.image_variants = existing_variants(image_name)
+        recipe = super().update(recipe, validated_data)
+        if not recipe.image_variants:
+            self.enqueue_image_variants(recipe)
+        return recipe
+
+    def ingredient_ids(self, ingredients):
+        return sorted({ingredient['id'] for ingredient in ingredients})
+
+    def image_name(self, recipe, image):
+        field = recipe.image.field
+        return field.storage.content_name(
+            field.generate_filename(recipe, image.name), image
+        )
+
+    def enqueue_image_variants(self, recipe):
+        recipe_id, image_name = recipe.id, recipe.image.name
+        transaction.on_commit(
+            lambda: enqueue_variants(recipe_id, image_name)
+        )
     
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return RecipeListSerializer(
             instance, context=context).data
 
@@ -276,49 +356,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Favorite
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        recipe = data['recipe']
-        if Favorite.objects.filter(user=request.user, recipe=recipe).exists():
-            raise serializers.ValidationError({
-                'status': 'Рецепт уже есть в избранном!'
-            })
-        return data
-
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        return RecipeSerializer(
-            instance.recipe, context=context).data
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        recipe = data['recipe']
-        if ShoppingCart.objects.filter(
-            user=request.user, recipe=recipe
-        ).exists():
-            raise serializers.ValidationError({
-                'status': 'Рецепт уже есть в списке покупок!'
-            })
-        return data
-
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        return RecipeSerializer(
-            instance.recipe, context=context).data
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=100
+    )
@@ -0,0 +1,104 @@
+import csv
+import json
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import ShoppingCartTotal
+
+PDF_FONT = 'ShoppingListFont'
+
+
+def shopping_list_rows(user):
+    return ShoppingCartTotal.objects.filter(user=user).values_list(
+        'ingredient__name',
+        'total_amount',
+        'ingredient__measurement_unit'
+    ).order_by('ingredient__name').iterator()
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_txt(rows):
+    for step, (name, amount, unit) in enumerate(rows, start=1):
+        yield f'{step}. {name} {amount} {unit}\n'
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_json(rows):
+    separator = '['
+    for name, amount, unit in rows:
+        yield separator + json.dumps(
+            {'name': name, 'amount': amount, 'measurement_unit': unit},
+            ensure_ascii=False
+        )
+        separator = ',\n'
+    yield '[]' if separator == '[' else ']'
+
+
+def pdf_font():
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        if not os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+            return 'Helvetica'
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_LIST_PDF_FONT)
+        )
+    return PDF_FONT
+
+
+def render_pdf(rows):
+    file = SpooledTemporaryFile(max_size=1024 * 1024)
+    pdf = canvas.Canvas(file, pagesize=A4)
+    font = pdf_font()
+    width, height = A4
+    line_height = 18
+    top = height - 50
+    y = top
+    pdf.setFont(font, 14)
+    for line in render_txt(rows):
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(font, 14)
+            y = top
+        pdf.drawString(50, y, line.rstrip('\n'))
+        y -= line_height
+    pdf.save()
+    file.seek(0)
+    return file
+
+
+FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'json': (render_json, 'application/json'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
+
+
+def shopping_list_response(user, file_format):
+    render, content_type = FORMATS[file_format]
+    filename = f'shopping_list.{file_format}'
+    content = render(shopping_list_rows(user))
+    if file_format == 'pdf':
+        return FileResponse(
+            content, as_attachment=True, filename=filename,
+            content_type=content_type
+        )
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,26 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.models import CustomUser
+from .authentication import forget_tokens
+from .metrics import install_timer
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    forget_tokens(instance.user_id, [instance.key])
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(instance, created, update_fields=None, **kwargs):
+    if not created and update_fields != frozenset(['last_login']):
+        forget_tokens(instance.pk, Token.objects.filter(
+            user=instance
+        ).values_list('key', flat=True))
+
+
+@receiver(connection_created)
+def connection_opened(connection, **kwargs):
+    install_timer(connection)
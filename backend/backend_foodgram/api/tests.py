@@ -0,0 +1,887 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.authentication import CachedTokenAuthentication, token_cache_key
+from api import async_views
+from api.autocomplete import ingredient_index
+from api.metrics import registry
+from recipes import cart_totals, feed, images, search
+from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                            ShoppingCart, Tag)
+from recipes.relations import relation_cache
+from recipes.seeding import SEED_IMAGE, seed
+from recipes.storage import recipe_image_storage
+from recipes.versions import bump_version
+from users.models import CustomUser, Follow
+
+TEST_SETTINGS = {
+    'IMAGE_WORKERS': 0,
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'REQUEST_METRICS': True,
+}
+MISSING_ID = 10 ** 9
+# Потолки времени ответа с запасом; на медленных машинах их можно
+# поднять, например TEST_LATENCY_SCALE=3.
+LATENCY_SCALE = float(os.getenv('TEST_LATENCY_SCALE', 1))
+
+# Асинхронные маршруты, как при ASYNC_READ_VIEWS=True.
+urlpatterns = [
+    path('api/recipes/', async_views.recipe_list, name='recipes-list'),
+    path('api/tags/', async_views.tag_list, name='tags-list'),
+]
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@override_settings(**TEST_SETTINGS)
+class FoodgramAPITestCase(APITestCase):
+    """Общие данные: немного пользователей, рецептов и связей между ними."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(users=8, recipes=40, ingredients=40, follows=3, favorites=4,
+             cart=3)
+        cls.user = CustomUser.objects.filter(
+            recipes__isnull=False, follower__isnull=False,
+            favorites__isnull=False, shopping_carts__isnull=False
+        ).distinct().first()
+        cls.user.is_staff = True
+        cls.user.save(update_fields=['is_staff'])
+        cls.token = Token.objects.create(user=cls.user)
+        cls.other = CustomUser.objects.exclude(pk=cls.user.pk).exclude(
+            following__user=cls.user
+        ).first()
+        untouched = Recipe.objects.exclude(author=cls.user).exclude(
+            favorites__user=cls.user
+        ).exclude(shopping_carts__user=cls.user)
+        cls.recipe = untouched.first()
+        cls.batch = list(untouched.exclude(pk=cls.recipe.pk).values_list(
+            'id', flat=True
+        )[:7])
+        cls.own_recipe = Recipe.objects.filter(author=cls.user).first()
+        cls.tag = Tag.objects.first()
+        cls.ingredient = Ingredient.objects.first()
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        relation_cache.clear()
+        search.trigram_enabled()
+
+    @contextmanager
+    def assertBudget(self, queries, milliseconds):
+        """Число запросов к БД и потолок времени ответа маршрута."""
+        ceiling = milliseconds * LATENCY_SCALE
+        started = time.perf_counter()
+        with self.assertNumQueries(queries):
+            yield
+        elapsed = (time.perf_counter() - started) * 1000
+        self.assertLessEqual(
+            elapsed, ceiling, f'{elapsed:.0f} мс > {ceiling:.0f} мс'
+        )
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # Прогрев кеша токенов и связей пользователя, как у живого клиента.
+        self.client.get('/api/users/me/')
+
+    def recipe_payload(self):
+        return {
+            'ingredients': [
+                {'id': pk, 'amount': amount}
+                for amount, pk in enumerate(
+                    Ingredient.objects.values_list('id', flat=True)[:15],
+                    start=1
+                )
+            ],
+            'tags': list(Tag.objects.values_list('id', flat=True)),
+            'image': image_base64(),
+            'name': 'Проверка бюджета',
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+
+
+class RecipeListTests(FoodgramAPITestCase):
+    def test_anonymous_list_queries(self):
+        # Версии данных для ключа кеша, COUNT, страница рецептов
+        # с авторами, теги и ингредиенты.
+        with self.assertBudget(5, 250):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], Recipe.objects.count())
+        self.assertEqual(len(response.data['results']), 6)
+        recipe = response.data['results'][0]
+        self.assertTrue(recipe['tags'])
+        self.assertTrue(recipe['ingredients'])
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        with self.assertBudget(5, 250):
+            response = self.client.get('/api/recipes/?limit=30')
+        self.assertEqual(len(response.data['results']), 30)
+
+    def test_authenticated_list_queries(self):
+        self.authenticate()
+        with self.assertBudget(5, 250):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        favorited = set(self.user.favorites.values_list(
+            'recipe_id', flat=True
+        ))
+        for recipe in response.data['results']:
+            self.assertEqual(recipe['is_favorited'], recipe['id'] in favorited)
+
+    def test_tags_filter(self):
+        with self.assertBudget(6, 250):
+            response = self.client.get(f'/api/recipes/?tags={self.tag.slug}')
+        self.assertEqual(
+            response.data['count'],
+            Recipe.objects.filter(tags=self.tag).count()
+        )
+        for recipe in response.data['results']:
+            self.assertIn(
+                self.tag.id, [tag['id'] for tag in recipe['tags']]
+            )
+
+    def test_search(self):
+        with self.assertBudget(5, 250):
+            response = self.client.get('/api/recipes/?search=Рецепт')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'])
+
+    def test_search_with_cursor(self):
+        with self.assertBudget(4, 250):
+            response = self.client.get('/api/recipes/?search=Рецепт&cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_cursor_ignores_counter_ordering(self):
+        expected = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        )[:12])
+        response = self.client.get(
+            '/api/recipes/?ordering=-favorites_count&cursor='
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            expected[:6]
+        )
+        # Счётчик рецепта со следующей страницы вырос между запросами.
+        Recipe.objects.filter(pk=expected[9]).update(
+            favorites_count=F('favorites_count') + 100
+        )
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            expected[6:]
+        )
+
+    def test_ingredient_filters(self):
+        included, excluded = Ingredient.objects.values_list(
+            'id', flat=True
+        )[:2]
+        with self.assertBudget(5, 250):
+            response = self.client.get(
+                f'/api/recipes/?ingredients={included}'
+                f'&exclude_ingredients={excluded}'
+            )
+        expected = Recipe.objects.filter(
+            ingredients=included
+        ).exclude(ingredients=excluded)
+        self.assertEqual(response.data['count'], expected.count())
+        for recipe in response.data['results']:
+            ingredient_ids = {
+                ingredient['id'] for ingredient in recipe['ingredients']
+            }
+            self.assertIn(included, ingredient_ids)
+            self.assertNotIn(excluded, ingredient_ids)
+
+    def test_is_favorited(self):
+        self.authenticate()
+        with self.assertBudget(5, 250):
+            response = self.client.get('/api/recipes/?is_favorited=1')
+        self.assertEqual(
+            response.data['count'], self.user.favorites.count()
+        )
+        for recipe in response.data['results']:
+            self.assertTrue(recipe['is_favorited'])
+
+    def test_is_in_shopping_cart(self):
+        self.authenticate()
+        with self.assertBudget(5, 250):
+            response = self.client.get('/api/recipes/?is_in_shopping_cart=1')
+        self.assertEqual(
+            response.data['count'], self.user.shopping_carts.count()
+        )
+        for recipe in response.data['results']:
+            self.assertTrue(recipe['is_in_shopping_cart'])
+
+    def test_feed(self):
+        self.authenticate()
+        with self.assertBudget(4, 250):
+            response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        followed = set(Follow.objects.filter(user=self.user).values_list(
+            'following_id', flat=True
+        ))
+        self.assertTrue(response.data['results'])
+        for recipe in response.data['results']:
+            self.assertIn(recipe['author']['id'], followed)
+
+
+class RecipeDetailTests(FoodgramAPITestCase):
+    def check_recipe(self, data):
+        self.assertEqual(data['id'], self.recipe.id)
+        self.assertEqual(data['name'], self.recipe.name)
+        self.assertEqual(data['author']['id'], self.recipe.author_id)
+        self.assertEqual(
+            len(data['ingredients']),
+            IngredientQuantity.objects.filter(recipe=self.recipe).count()
+        )
+
+    def test_anonymous(self):
+        with self.assertBudget(5, 150):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.check_recipe(response.data)
+        self.assertIn('ETag', response)
+
+    def test_authenticated(self):
+        self.authenticate()
+        with self.assertBudget(6, 150):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.check_recipe(response.data)
+        self.assertFalse(response.data['is_favorited'])
+
+    def test_missing(self):
+        response = self.client.get(f'/api/recipes/{MISSING_ID}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogTests(FoodgramAPITestCase):
+    def test_tags(self):
+        with self.assertBudget(2, 100):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(
+            sorted(tag['slug'] for tag in response.data),
+            sorted(Tag.objects.values_list('slug', flat=True))
+        )
+
+    def test_tag_detail(self):
+        with self.assertBudget(2, 100):
+            response = self.client.get(f'/api/tags/{self.tag.id}/')
+        self.assertEqual(response.data['slug'], self.tag.slug)
+
+    def test_ingredient_search(self):
+        prefix = self.ingredient.name[:3]
+        with self.assertBudget(2, 150):
+            response = self.client.get(f'/api/ingredients/?name={prefix}')
+        self.assertEqual(
+            len(response.data),
+            Ingredient.objects.filter(name__istartswith=prefix).count()
+        )
+        for ingredient in response.data:
+            self.assertTrue(ingredient['name'].startswith(prefix))
+
+    def test_ingredient_detail(self):
+        with self.assertBudget(2, 100):
+            response = self.client.get(
+                f'/api/ingredients/{self.ingredient.id}/'
+            )
+        self.assertEqual(response.data['name'], self.ingredient.name)
+
+
+@override_settings(INGREDIENT_PREFIX_INDEX=True)
+class IngredientIndexTests(FoodgramAPITestCase):
+    def setUp(self):
+        super().setUp()
+        ingredient_index.refresh()
+        self.prefix = self.ingredient.name[:3]
+        self.url = f'/api/ingredients/?name={self.prefix}'
+
+    def test_index_response_has_validators(self):
+        # Одна отметка справочника и для ETag, и для сверки индекса.
+        with self.assertBudget(1, 150):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            [ingredient['id'] for ingredient in response.data],
+            list(Ingredient.objects.filter(
+                name__istartswith=self.prefix
+            ).values_list('id', flat=True))
+        )
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_index_falls_back_to_sql(self):
+        etag = self.client.get(self.url)['ETag']
+        Ingredient.objects.create(
+            name=f'{self.prefix} новый', measurement_unit='г'
+        )
+        bump_version('ingredients')
+        with mock.patch.object(
+            ingredient_index, 'refresh_in_background'
+        ) as refresh:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        refresh.assert_called_once()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(
+            f'{self.prefix} новый',
+            [ingredient['name'] for ingredient in response.data]
+        )
+
+    def test_index_matches_sql_for_yo(self):
+        Ingredient.objects.bulk_create([
+            Ingredient(name='ёжевика', measurement_unit='г'),
+            Ingredient(name='ежевичный джем', measurement_unit='г'),
+        ])
+        bump_version('ingredients')
+        for prefix in ('ёж', 'еж'):
+            url = f'/api/ingredients/?name={prefix}'
+            with self.settings(INGREDIENT_PREFIX_INDEX=False):
+                expected = self.client.get(url).data
+            ingredient_index.refresh()
+            self.assertEqual(self.client.get(url).data, expected)
+
+
+class ConditionalGetTests(FoodgramAPITestCase):
+    def test_not_modified(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.assertBudget(1, 100):
+            response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stamps_do_not_depend_on_process_cache(self):
+        response = self.client.get('/api/ingredients/')
+        # Другой воркер начинает с пустым кешем и видит те же отметки.
+        for cache in caches.all():
+            cache.clear()
+        again = self.client.get('/api/ingredients/')
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(again['Last-Modified'], response['Last-Modified'])
+
+    def test_bump_from_another_process(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        # Так отметку меняет load_ingredients, запущенная отдельно.
+        bump_version('ingredients')
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_recipe_etag_follows_catalogs(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        bump_version('tags')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_counters_reach_anonymous_cache(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        stale = self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{url}favorite/')
+        self.client.credentials()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(
+            response.data['favorites_count'],
+            stale.data['favorites_count'] + 1
+        )
+        self.assertNotEqual(response['ETag'], stale['ETag'])
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=stale['ETag']).status_code,
+            200
+        )
+        revalidated = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        listed = self.client.get('/api/recipes/?limit=40')
+        self.assertEqual(listed['X-Cache'], 'MISS')
+        self.assertIn(
+            response.data['favorites_count'],
+            [recipe['favorites_count'] for recipe in listed.data['results']
+             if recipe['id'] == self.recipe.id]
+        )
+
+
+class UserTests(FoodgramAPITestCase):
+    def test_list(self):
+        with self.assertBudget(1, 150):
+            response = self.client.get('/api/users/')
+        self.assertEqual(len(response.data), CustomUser.objects.count())
+
+    def test_me(self):
+        self.authenticate()
+        # Версия подписок и счётчики, которые не кешируются с токеном.
+        with self.assertBudget(2, 100):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['id'], self.user.id)
+        self.assertEqual(response.data['email'], self.user.email)
+
+    def test_detail(self):
+        self.authenticate()
+        with self.assertBudget(2, 100):
+            response = self.client.get(f'/api/users/{self.other.id}/')
+        self.assertEqual(response.data['id'], self.other.id)
+        self.assertFalse(response.data['is_subscribed'])
+
+
+class TokenAuthenticationTests(FoodgramAPITestCase):
+    def test_cached_token_runs_one_stamp_query(self):
+        self.authenticate()
+        authentication = CachedTokenAuthentication()
+        # Только сверка версий токенов и подписок пользователя.
+        with self.assertNumQueries(1):
+            user, token = authentication.authenticate_credentials(
+                self.token.key
+            )
+        self.assertEqual(user, self.user)
+        self.assertEqual(token, self.token)
+
+    def test_counters_are_read_fresh(self):
+        self.authenticate()
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            recipes_count=F('recipes_count') + 5,
+            followers_count=F('followers_count') + 2
+        )
+        self.user.refresh_from_db()
+        # Снимок из кеша без счётчиков: они читаются одним запросом,
+        # ещё один читает версию подписок.
+        with self.assertBudget(2, 100):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(
+            response.data['recipes_count'], self.user.recipes_count
+        )
+        self.assertEqual(
+            response.data['followers_count'], self.user.followers_count
+        )
+
+    def test_feed_inbox_is_read_fresh(self):
+        self.authenticate()
+        authentication = CachedTokenAuthentication()
+        user, _ = authentication.authenticate_credentials(self.token.key)
+        self.assertFalse(user.feed_inbox)
+        CustomUser.objects.filter(pk=self.user.pk).update(feed_inbox=True)
+        user, _ = authentication.authenticate_credentials(self.token.key)
+        self.assertTrue(user.feed_inbox)
+
+    def test_feed_after_inbox_rebuild(self):
+        with self.settings(FEED_INBOX_MIN_FOLLOWS=1):
+            feed.rebuild()
+            self.authenticate()
+            self.client.get('/api/recipes/feed/')
+            with self.settings(FEED_INBOX_MIN_FOLLOWS=100):
+                feed.rebuild()
+            # Флаг снят и входящие очищены: лента идёт по подпискам.
+            response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'])
+
+    def test_deactivation_evicts_snapshot(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocation_reaches_other_workers(self):
+        self.authenticate()
+        # Отзыв обрабатывает другой воркер: чистится только его кеш.
+        other_worker = LocMemCache('other-worker', {})
+        with mock.patch(
+            'api.authentication.token_cache', return_value=other_worker
+        ):
+            self.user.is_active = False
+            self.user.save()
+        self.assertIsNotNone(
+            caches['tokens'].get(token_cache_key(self.token.key))
+        )
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_evicts_snapshot(self):
+        self.authenticate()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+
+class RecipeWriteTests(FoodgramAPITestCase):
+    def test_create(self):
+        self.authenticate()
+        payload = self.recipe_payload()
+        # На PostgreSQL добавляется пересчёт поискового вектора.
+        with self.assertBudget(17 + 2 * search.enabled(), 500):
+            response = self.client.post(
+                '/api/recipes/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(recipe.author, self.user)
+        self.assertEqual(recipe.name, payload['name'])
+        self.assertEqual(
+            sorted(recipe.ingredientquantity_set.values_list(
+                'ingredient_id', 'amount'
+            )),
+            sorted(
+                (item['id'], item['amount'])
+                for item in payload['ingredients']
+            )
+        )
+
+    def test_update(self):
+        self.authenticate()
+        payload = self.recipe_payload()
+        with self.assertBudget(24 + search.enabled(), 500):
+            response = self.client.patch(
+                f'/api/recipes/{self.own_recipe.id}/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], payload['name'])
+        self.assertEqual(
+            len(response.data['ingredients']), len(payload['ingredients'])
+        )
+
+    def test_update_bumps_recipes_once(self):
+        self.authenticate()
+        payload = self.recipe_payload()
+        del payload['image']
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(
+                    f'/api/recipes/{self.own_recipe.id}/', payload,
+                    format='json'
+                )
+        # Рецепт, его ингредиенты и теги — одна версия 'recipes'.
+        self.assertEqual(len([
+            query for query in queries
+            if 'dataversion' in query['sql']
+            and "'recipes'" in query['sql']
+        ]), 1)
+
+    def test_delete(self):
+        ShoppingCart.objects.get_or_create(
+            user=self.other, recipe=self.own_recipe
+        )
+        self.authenticate()
+        with self.assertBudget(19, 250):
+            response = self.client.delete(
+                f'/api/recipes/{self.own_recipe.id}/'
+            )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            Recipe.objects.filter(pk=self.own_recipe.id).exists()
+        )
+        self.assertEqual(
+            cart_totals.stored_totals(), cart_totals.live_totals()
+        )
+
+    def test_delete_foreign_recipe(self):
+        self.authenticate()
+        response = self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_reused_image_survives_collection(self):
+        name = recipe_image_storage.save(
+            'recipes/first.png', ContentFile(b'image')
+        )
+        old = time.time() - 7200
+        os.utime(recipe_image_storage.path(name), (old, old))
+        # Ссылка из нового рецепта ещё не сохранена, а сборщик уже идёт.
+        self.assertEqual(
+            recipe_image_storage.save(
+                'recipes/second.png', ContentFile(b'image')
+            ),
+            name
+        )
+        call_command('collect_recipe_images', stdout=io.StringIO())
+        self.assertTrue(recipe_image_storage.exists(name))
+
+
+class ImageVariantTests(FoodgramAPITestCase):
+    def test_build_missing_variants(self):
+        path = recipe_image_storage.path(SEED_IMAGE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', (64, 64), 'orange').save(path)
+        call_command('build_image_variants', stdout=io.StringIO())
+        self.assertFalse(Recipe.objects.filter(image_variants={}).exists())
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).image_variants,
+            images.expected_variants(SEED_IMAGE)
+        )
+        output = io.StringIO()
+        call_command('build_image_variants', '--dry-run', stdout=output)
+        self.assertIn('вариантов: 0.', output.getvalue())
+
+    def test_failed_job_is_logged(self):
+        future = Future()
+        future.set_exception(OSError('нет файла'))
+        with self.assertLogs(images.logger, 'ERROR'):
+            images.variants_done(None, self.recipe.id, SEED_IMAGE, future)
+
+
+class RecipeToggleTests(FoodgramAPITestCase):
+    def test_favorite(self):
+        self.authenticate()
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        with self.assertBudget(6, 150):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.recipe.id)
+        self.assertEqual(response.data['name'], self.recipe.name)
+        self.assertTrue(Favorite.objects.filter(
+            user=self.user, recipe=self.recipe
+        ).exists())
+        with self.assertBudget(5, 150):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data, {'status': ['Рецепт уже есть в избранном!']}
+        )
+        with self.assertBudget(5, 150):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Favorite.objects.filter(
+            user=self.user, recipe=self.recipe
+        ).exists())
+        with self.assertBudget(5, 150):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_favorite_missing_recipe(self):
+        self.authenticate()
+        response = self.client.post(f'/api/recipes/{MISSING_ID}/favorite/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recipe', response.data)
+
+    def test_shopping_cart(self):
+        self.authenticate()
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        with self.assertBudget(7, 150):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.recipe.id)
+        with self.assertBudget(2, 250):
+            response = self.client.get('/api/recipes/download_shopping_cart/')
+            shopping_list = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        for name in IngredientQuantity.objects.filter(
+            recipe=self.recipe
+        ).values_list('ingredient__name', flat=True):
+            self.assertIn(name, shopping_list)
+        with self.assertBudget(7, 150):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ShoppingCart.objects.filter(
+            user=self.user, recipe=self.recipe
+        ).exists())
+
+    def check_batch(self, response, status):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            *({'id': pk, 'status': status} for pk in self.batch),
+            {'id': MISSING_ID, 'status': 'not_found'},
+        ])
+
+    def test_batch_favorite(self):
+        self.authenticate()
+        payload = {'recipes': [*self.batch, MISSING_ID]}
+        with self.assertBudget(6, 250):
+            response = self.client.post(
+                '/api/recipes/favorite/', payload, format='json'
+            )
+        self.check_batch(response, 'added')
+        self.assertEqual(Favorite.objects.filter(
+            user=self.user, recipe__in=self.batch
+        ).count(), len(self.batch))
+        with self.assertBudget(6, 250):
+            response = self.client.delete(
+                '/api/recipes/favorite/', payload, format='json'
+            )
+        self.check_batch(response, 'removed')
+
+    def test_batch_shopping_cart(self):
+        self.authenticate()
+        payload = {'recipes': [*self.batch, MISSING_ID]}
+        with self.assertBudget(7, 250):
+            response = self.client.post(
+                '/api/recipes/shopping_cart/', payload, format='json'
+            )
+        self.check_batch(response, 'added')
+        with self.assertBudget(8, 250):
+            response = self.client.delete(
+                '/api/recipes/shopping_cart/', payload, format='json'
+            )
+        self.check_batch(response, 'removed')
+        self.assertFalse(ShoppingCart.objects.filter(
+            user=self.user, recipe__in=self.batch
+        ).exists())
+
+
+class SubscribeTests(FoodgramAPITestCase):
+    def test_subscribe(self):
+        self.authenticate()
+        url = f'/api/users/{self.other.id}/subscribe/'
+        with self.assertBudget(6, 150):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data, {'user': self.user.id, 'following': self.other.id}
+        )
+        with self.assertBudget(6, 150):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'non_field_errors': [
+            'Вы уже подписаны на данного пользователя!'
+        ]})
+        with self.assertBudget(6, 150):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.filter(
+            user=self.user, following=self.other
+        ).exists())
+        with self.assertBudget(5, 150):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_subscribe_to_self(self):
+        self.authenticate()
+        response = self.client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {
+            'non_field_errors': ['Вы не можете подписаться на себя!']
+        })
+
+
+class SubscriptionListTests(FoodgramAPITestCase):
+    def test_recipes_limit_without_subscriptions(self):
+        lonely = CustomUser.objects.create_user(
+            username='lonely', email='lonely@example.com', password='x'
+        )
+        self.client.force_authenticate(lonely)
+        response = self.client.get('/api/users/subscriptions/?recipes_limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['results'], [])
+
+    def test_first_per_author_without_authors(self):
+        self.assertEqual(list(Recipe.objects.first_per_author([], 3)), [])
+
+    def test_recipes_limit(self):
+        self.authenticate()
+        with self.assertBudget(4, 250):
+            response = self.client.get(
+                '/api/users/subscriptions/?recipes_limit=1'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['count'],
+            Follow.objects.filter(user=self.user).count()
+        )
+        for author in response.data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertLessEqual(len(author['recipes']), 1)
+            self.assertEqual(
+                author['recipes_count'],
+                Recipe.objects.filter(author_id=author['id']).count()
+            )
+
+
+class AdminEndpointTests(FoodgramAPITestCase):
+    def test_cache_stats(self):
+        self.client.get('/api/recipes/')
+        self.client.get('/api/recipes/')
+        self.authenticate()
+        with self.assertBudget(1, 100):
+            response = self.client.get('/api/recipes/cache-stats/')
+        self.assertEqual(response.data, {'hit': 1, 'miss': 1})
+
+    def test_metrics(self):
+        self.authenticate()
+        with self.assertBudget(1, 100):
+            response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view="customuser-me"', response.content.decode())
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.get('/api/recipes/cache-stats/')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ROOT_URLCONF=__name__, **TEST_SETTINGS)
+class AsyncMetricsTests(TransactionTestCase):
+    """Запросы из пула потоков БД попадают в метрики представления."""
+
+    def setUp(self):
+        registry.clear()
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        for cache in caches.all():
+            cache.clear()
+        # Отдельный пул, чтобы закрыть его соединения после теста.
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        patcher = mock.patch.object(async_views, 'db_executor', self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(
+            lambda: self.executor.submit(connections.close_all).result()
+        )
+
+    async def test_async_routes_count_queries(self):
+        for url, view in (
+            ('/api/tags/', 'tags-list'), ('/api/recipes/', 'recipes-list')
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(registry.histograms['db_queries', view].sum, 0)
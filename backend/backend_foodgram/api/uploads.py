@@ -0,0 +1,299 @@
+import base64
+import binascii
+import codecs
+import re
+import uuid
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import json
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_LENGTH = 256
+MAX_KEY_LENGTH = 64
+IMAGE_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'GIF': ('gif', 'image/gif'),
+    'WEBP': ('webp', 'image/webp'),
+}
+SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class ImageUploadError(ValueError):
+    pass
+
+
+def has_image_signature(head):
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return True
+    return head.startswith(SIGNATURES)
+
+
+class Base64Upload:
+    """Декодирует base64 частями во временный файл."""
+
+    def __init__(self):
+        self.file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        self.max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        self.header = ''
+        self.tail = ''
+        self.head = b''
+        self.size = 0
+        self.content_type = None
+
+    def write(self, text):
+        if self.header is not None:
+            text = self.strip_header(text)
+            if not text:
+                return
+        text = self.tail + ''.join(text.split())
+        end = len(text) - len(text) % 4
+        self.tail = text[end:]
+        self.decode(text[:end])
+
+    def strip_header(self, text):
+        self.header += text
+        if not self.header.startswith('data:'[:len(self.header)]):
+            text, self.header = self.header, None
+            return text
+        if ',' not in self.header:
+            if len(self.header) > MAX_HEADER_LENGTH:
+                raise ImageUploadError('Некорректный заголовок data URL.')
+            return ''
+        prefix, text = self.header.split(',', 1)
+        if not prefix.endswith(';base64'):
+            raise ImageUploadError('Ожидается изображение в base64.')
+        self.content_type = prefix[len('data:'):-len(';base64')] or None
+        self.header = None
+        return text
+
+    def decode(self, text):
+        if not text:
+            return
+        try:
+            data = base64.b64decode(text, validate=True)
+        except binascii.Error:
+            raise ImageUploadError('Некорректные данные base64.')
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise ImageUploadError(
+                'Размер изображения не должен превышать '
+                f'{self.max_bytes // (1024 * 1024)} МБ.'
+            )
+        if len(self.head) < 12:
+            self.head += data[:12]
+            if len(self.head) >= 12 and not has_image_signature(self.head):
+                raise ImageUploadError(
+                    'Загрузите изображение в формате JPEG, PNG, GIF или WEBP.'
+                )
+        self.file.write(data)
+
+    def close(self):
+        if self.header is not None:
+            if self.header.startswith('data:'):
+                raise ImageUploadError('Некорректный заголовок data URL.')
+            text, self.header = self.header, None
+            self.write(text)
+        if self.tail:
+            self.decode(self.tail + '=' * (-len(self.tail) % 4))
+            self.tail = ''
+        self.file.seek(0)
+        return UploadedFile(
+            self.file, name='image', content_type=self.content_type,
+            size=self.size
+        )
+
+
+def decode_base64(text):
+    upload = Base64Upload()
+    for start in range(0, len(text), CHUNK_SIZE):
+        upload.write(text[start:start + CHUNK_SIZE])
+    return upload.close()
+
+
+class ImageFieldScanner:
+    """Копирует JSON, на лету вынимая значение одного поля верхнего уровня."""
+
+    def __init__(self, field):
+        self.field = field
+        self.max_length = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        self.parts = []
+        self.length = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.key = None
+        self.last_string = None
+        self.value_expected = False
+        self.upload = None
+        self.image_tail = ''
+        self.in_image = False
+
+    def emit(self, text):
+        self.length += len(text)
+        if self.max_length is not None and self.length > self.max_length:
+            raise ParseError('Слишком большое тело запроса.')
+        self.parts.append(text)
+
+    def collect(self, text):
+        if self.key is not None:
+            self.key += text
+            if len(self.key) > MAX_KEY_LENGTH:
+                self.key = None
+
+    def feed(self, text):
+        position = 0
+        while position < len(text):
+            if self.in_image:
+                position = self.feed_image(text, position)
+            elif self.in_string:
+                position = self.feed_string(text, position)
+            else:
+                position = self.feed_structure(text, position)
+
+    def feed_image(self, text, position):
+        end = text.find('"', position)
+        segment = self.image_tail + text[position:len(text) if end == -1
+                                         else end]
+        self.image_tail = ''
+        if end == -1 and segment.endswith('\\'):
+            segment, self.image_tail = segment[:-1], '\\'
+        self.upload.write(
+            segment.replace('\\/', '/').replace('\\n', '').replace('\\r', '')
+        )
+        if end == -1:
+            return len(text)
+        self.in_image = False
+        self.emit('null')
+        return end + 1
+
+    def feed_string(self, text, position):
+        if self.escape:
+            self.escape = False
+            self.emit(text[position])
+            self.collect(text[position])
+            return position + 1
+        match = STRING_SPECIAL.search(text, position)
+        end = match.start() if match else len(text)
+        self.emit(text[position:end])
+        self.collect(text[position:end])
+        if not match:
+            return end
+        char = text[end]
+        self.emit(char)
+        if char == '\\':
+            self.escape = True
+            return end + 1
+        self.in_string = False
+        self.last_string, self.key = self.key, None
+        return end + 1
+
+    def feed_structure(self, text, position):
+        char = text[position]
+        if self.value_expected and not char.isspace():
+            self.value_expected = False
+            if char == '"':
+                self.upload = Base64Upload()
+                self.in_image = True
+                return position + 1
+        self.emit(char)
+        if char == '"':
+            self.in_string = True
+            self.key = '' if self.depth == 1 else None
+        elif char in '{[':
+            self.depth += 1
+        elif char in '}]':
+            self.depth -= 1
+        elif char == ':' and self.depth == 1:
+            self.value_expected = self.last_string == self.field
+        elif char == ',':
+            self.last_string = None
+        return position + 1
+
+    def close(self):
+        upload = self.upload
+        if upload is not None and not self.in_image:
+            upload = upload.close()
+        return ''.join(self.parts), upload
+
+
+class Base64ImageJSONParser(JSONParser):
+    """JSON-парсер, не держащий изображение в памяти целиком."""
+    image_field = 'image'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        scanner = ImageFieldScanner(self.image_field)
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                scanner.feed(decoder.decode(chunk))
+            scanner.feed(decoder.decode(b'', final=True))
+            text, upload = scanner.close()
+        except ImageUploadError as error:
+            raise serializers.ValidationError(
+                {self.image_field: [str(error)]}
+            )
+        except ValueError as error:
+            raise ParseError('JSON parse error - %s' % str(error))
+        parse_constant = json.strict_constant if self.strict else None
+        try:
+            data = json.loads(text, parse_constant=parse_constant)
+        except ValueError as error:
+            raise ParseError('JSON parse error - %s' % str(error))
+        if upload is not None and isinstance(data, dict):
+            data[self.image_field] = upload
+        return data
+
+
+class Base64ImageField(serializers.FileField):
+    """Изображение в base64 без полного декодирования в памяти."""
+    default_error_messages = {
+        'invalid_image': 'Загрузите изображение в формате JPEG, PNG, GIF '
+                         'или WEBP.',
+        'max_pixels': 'Изображение не должно превышать {max_pixels} '
+                      'пикселей.',
+    }
+
+    def to_internal_value(self, data):
+        if data in (None, ''):
+            return None
+        if isinstance(data, str):
+            try:
+                data = decode_base64(data)
+            except ImageUploadError as error:
+                raise serializers.ValidationError(str(error))
+        data = super().to_internal_value(data)
+        extension, content_type = self.check_image(data)
+        data.name = f'{uuid.uuid4()}.{extension}'
+        data.content_type = content_type
+        return data
+
+    def check_image(self, data):
+        max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        try:
+            with Image.open(data) as image:
+                if image.format not in IMAGE_FORMATS:
+                    self.fail('invalid_image')
+                width, height = image.size
+                if width * height > max_pixels:
+                    self.fail('max_pixels', max_pixels=max_pixels)
+                image.verify()
+                image_format = image.format
+        except Image.DecompressionBombError:
+            self.fail('max_pixels', max_pixels=max_pixels)
+        except (OSError, SyntaxError, ValueError):
+            self.fail('invalid_image')
+        finally:
+            data.seek(0)
+        return IMAGE_FORMATS[image_format]
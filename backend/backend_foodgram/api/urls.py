@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (IngredientViewSet, RecipeViewSet, TagViewSet,
-                    FollowApiView, FollowListAPIView)
+                    FollowApiView, FollowListAPIView, RecipeCacheStatsAPIView,
+                    RequestMetricsAPIView)
 
 router = DefaultRouter()
 
@@ -14,7 +16,26 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('users/<int:id>/subscribe/', FollowApiView.as_view(), name='subscribe'),
     path('users/subscriptions/', FollowListAPIView.as_view(), name='subscription'),
+    path('recipes/cache-stats/', RecipeCacheStatsAPIView.as_view(), name='recipes-cache-stats'),
+    path('metrics/', RequestMetricsAPIView.as_view(), name='metrics'),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include('djoser.urls')),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list, name='recipes-list'),
+        path('recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipes-detail'),
+        path('users/subscriptions/', async_views.subscriptions,
+             name='subscription'),
+        path('tags/', async_views.tag_list, name='tags-list'),
+        path('tags/<int:pk>/', async_views.tag_detail, name='tags-detail'),
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredients-list'),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail,
+             name='ingredients-detail'),
+    ] + urlpatterns
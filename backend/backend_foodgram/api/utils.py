@@ -1,5 +1,6 @@
 from django.shortcuts import get_object_or_404
 from rest_framework import status
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.response import Response
 
 from recipes.models import Recipe
@@ -37,3 +38,10 @@ def add_delete(request, model, obj_id):
         serializer.data,
         status=status.HTTP_201_CREATED
     )
+
+
+class IgnoreFormatContentNegotiation(DefaultContentNegotiation):
+    """Не даёт DRF трактовать ?format= как выбор рендерера."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -1,166 +1,320 @@
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
-from rest_framework import status, viewsets
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Value
+from django.http import Http404, HttpResponse
+from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 
-from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
-                            ShoppingCart, Tag)
+from recipes import bulk, cart_totals
+from recipes.feed import feed_queryset
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            Tag)
 from users.models import CustomUser, Follow
+from .autocomplete import ingredient_index
+from .conditional import (CatalogConditionalMixin, catalog_stamp,
+                          recipe_conditional)
+from .metrics import registry
 from .filters import IngredientFilter, UserRecipeFilter
-from .paginator import PageNumberPagination
+from .paginator import IdCursorPagination, PageNumberOrCursorPagination
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, 
-                          FollowSerializer, FollowListSerializer,
-                          IngredientSerializer,
-                          RecipeListSerializer, RecipeWriteSerializer,
-                          ShoppingCartSerializer, TagSerializer)
+from .response_cache import AnonymousResponseCacheMixin, cache_stats
+from .serializers import (FollowListSerializer, IngredientSerializer,
+                          RecipeIdsSerializer, RecipeListSerializer,
+                          RecipeSerializer, RecipeWriteSerializer,
+                          TagSerializer)
+from .shopping_list import FORMATS as SHOPPING_LIST_FORMATS
+from .shopping_list import shopping_list_response
+from .uploads import Base64ImageJSONParser
+from .utils import IgnoreFormatContentNegotiation
+
+
+def does_not_exist(pk):
+    return serializers.PrimaryKeyRelatedField.default_error_messages[
+        'does_not_exist'
+    ].format(pk_value=pk)
 
 
 class FollowApiView(APIView):
     permission_classes = [IsAuthenticated]
 
     @action(detail=True, methods=['post', ],)
+    @transaction.atomic
     def post(self, request, id):
-        data = {'user': request.user.id, 'following': id}
-        serializer = FollowSerializer(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        user = request.user
+        if user.id == id:
+            raise serializers.ValidationError(
+                {'non_field_errors': ['Вы не можете подписаться на себя!']}
+            )
+        if bulk.insert_relations(Follow, user.id, [id]):
+            return Response(
+                {'user': user.id, 'following': id},
+                status=status.HTTP_201_CREATED
+            )
+        if not CustomUser.objects.filter(id=id).exists():
+            raise serializers.ValidationError(
+                {'following': [does_not_exist(id)]}
+            )
+        raise serializers.ValidationError({'non_field_errors': [
+            'Вы уже подписаны на данного пользователя!'
+        ]})
 
+    @transaction.atomic
     def delete(self, request, id):
-        user = request.user
-        following = get_object_or_404(CustomUser, id=id)
-        follow = get_object_or_404(
-            Follow, user=user, following=following
-        )
-        follow.delete()
+        if not bulk.delete_relations(Follow, request.user.id, [id]):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class FollowListAPIView(ListAPIView):
-    pagination_class = PageNumberPagination
+    serializer_class = FollowListSerializer
+    pagination_class = PageNumberOrCursorPagination
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        return CustomUser.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('-id')
+
     def get(self, request):
-        user = request.user
-        queryset = CustomUser.objects.filter(following__user=user)
-        page = self.paginate_queryset(queryset)
-        serializer = FollowListSerializer(
-            page, many=True,
-            context={'request': request}
-        )
+        page = self.paginate_queryset(self.get_queryset())
+        self.attach_recipes(page, request.query_params.get('recipes_limit'))
+        serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
 
+    def attach_recipes(self, authors, recipes_limit):
+        authors_by_id = {}
+        for author in authors:
+            author.page_recipes = []
+            authors_by_id[author.id] = author
+        if recipes_limit is not None:
+            recipes = Recipe.objects.first_per_author(
+                authors_by_id, int(recipes_limit)
+            )
+        else:
+            recipes = Recipe.objects.filter(author_id__in=authors_by_id)
+        for recipe in recipes:
+            authors_by_id[recipe.author_id].page_recipes.append(recipe)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = PageNumberPagination
+    pagination_class = PageNumberOrCursorPagination
     filter_class = UserRecipeFilter
+    lookup_value_regex = r'\d+'
+    parser_classes = (Base64ImageJSONParser, FormParser, MultiPartParser)
 
-    def get_serializer_class(self):
+    def get_queryset(self):
+        queryset = super().get_queryset()
         if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related()
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeListSerializer
         return RecipeWriteSerializer
 
+    @transaction.atomic
+    def perform_destroy(self, recipe):
+        """Удаляет ингредиенты рецепта одним запросом, а не каскадом.
+
+        Каскад шлёт сигналы на каждую строку: отдельный запрос к итогам
+        корзин и пересчёт поиска по рецепту, который всё равно удаляется.
+        Итоги корзин здесь уменьшаются одним пакетом.
+        """
+        cart_totals.change_ingredients(recipe.id, {
+            ingredient_id: -amount
+            for ingredient_id, amount in bulk.delete_ingredients(
+                recipe.id
+            ).items()
+        })
+        recipe.delete()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(RecipeViewSet, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return recipe_conditional(
+            request, kwargs[self.lookup_field],
+            lambda: self.cached_response(
+                request, lambda: super(RecipeViewSet, self).retrieve(
+                    request, *args, **kwargs
+                )
+            )
+        )
+
     @action(
         methods=['post', 'delete'],
         detail=True,
         url_path='favorite',
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def favorite(self, request, pk=None):
-        if request.method == 'POST':
-            data = {'user': request.user.id, 'recipe': pk}
-            serializer = FavoriteSerializer(
-                data=data, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            user = request.user
-            recipe = get_object_or_404(Recipe, id=pk)
-            favorite = get_object_or_404(
-                Favorite, user=user, recipe=recipe
-            )
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return None
-    
+        return self.toggle(
+            request, Favorite, int(pk), 'Рецепт уже есть в избранном!'
+        )
+
     @action(
         methods=['post', 'delete'],
         detail=True,
         url_path='shopping_cart',
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk):
-        if request.method == 'POST':
-            data = {'user': request.user.id, 'recipe': pk}
-            serializer = ShoppingCartSerializer(
-                data=data, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.toggle(
+            request, ShoppingCart, int(pk), 'Рецепт уже есть в списке покупок!'
+        )
+
+    def toggle(self, request, model, pk, already_added):
+        """Одна вставка или удаление с RETURNING вместо проверки и записи.
+
+        Повторный клик не добавит строку и не упадёт на уникальном
+        ограничении, а пустой RETURNING разбирается уже после записи.
+        """
+        user_id = request.user.id
         if request.method == 'DELETE':
-            user = request.user
-            recipe = get_object_or_404(Recipe, id=pk)
-            shopping_cart = get_object_or_404(
-                ShoppingCart, user=user, recipe=recipe
-            )
-            shopping_cart.delete()
+            if not bulk.delete_relations(model, user_id, [pk]):
+                raise Http404
             return Response(status=status.HTTP_204_NO_CONTENT)
-        return None
-    
+        if bulk.insert_relations(model, user_id, [pk]):
+            recipe = Recipe.objects.only(*RecipeSerializer.Meta.fields).get(
+                pk=pk
+            )
+            return Response(
+                RecipeSerializer(recipe, context={'request': request}).data,
+                status=status.HTTP_201_CREATED
+            )
+        if not Recipe.objects.filter(pk=pk).exists():
+            raise serializers.ValidationError({'recipe': [does_not_exist(pk)]})
+        return Response(
+            {'status': [already_added]}, status=status.HTTP_400_BAD_REQUEST
+        )
+
     @action(
+        methods=['post', 'delete'],
         detail=False,
-        url_path='download_shopping_cart',
+        url_path='favorite',
+        url_name='favorite-many',
+        permission_classes=(IsAuthenticated,)
+    )
+    @transaction.atomic
+    def favorite_many(self, request):
+        return self.change_many(request, Favorite)
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        url_path='shopping_cart',
+        url_name='shopping-cart-many',
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
+    def shopping_cart_many(self, request):
+        return self.change_many(request, ShoppingCart)
+
+    def change_many(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = (
+            bulk.add_recipes if request.method == 'POST'
+            else bulk.remove_recipes
+        )
+        return Response({'results': change(
+            model, request.user.id, serializer.validated_data['recipes']
+        )})
+
+    @action(
+        detail=False,
+        url_path='feed',
+        permission_classes=(IsAuthenticated,),
+        pagination_class=IdCursorPagination
+    )
+    def feed(self, request):
+        queryset = self.filter_queryset(
+            feed_queryset(request.user).with_related()
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        url_path='download_shopping_cart',
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=IgnoreFormatContentNegotiation
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        cart_list = IngredientQuantity.objects.filter(
-            recipe__shopping_carts__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(sum_amount=Sum('amount'))
-        list_cart = []
-        for step, ingredient in enumerate(cart_list, start=1):
-            name = ingredient["ingredient__name"]
-            amount = ingredient["sum_amount"]
-            unit = ingredient["ingredient__measurement_unit"]
-            list_cart.append(
-                f'{step}. '
-                f'{name} '
-                f'{amount} '
-                f'{unit}\n',
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'format': 'Доступные форматы: '
+                           + ', '.join(SHOPPING_LIST_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        response = HttpResponse(
-            list_cart,
-            content_type='text/plain'
-        )
-        response['Content-Disposition'] = (
-            'attachment; '
-            'filename="shopping_list.txt"'
+        return shopping_list_response(request.user, file_format)
+
+
+class RecipeCacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class RequestMetricsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        if not settings.REQUEST_METRICS:
+            raise Http404
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
         )
-        return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogConditionalMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    catalog = 'tags'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogConditionalMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_class = IngredientFilter
     permission_classes = (IsAdminOrReadOnly,)
+    catalog = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name or not settings.INGREDIENT_PREFIX_INDEX:
+            return super().list(request, *args, **kwargs)
+        return self.catalog_conditional(
+            request, lambda: self.prefix_list(request, name, *args, **kwargs)
+        )
+
+    def prefix_list(self, request, name, *args, **kwargs):
+        version, _ = catalog_stamp(request, self.catalog)
+        ingredients = ingredient_index.search(name, version)
+        if ingredients is not None:
+            return Response(ingredients)
+        return super(CatalogConditionalMixin, self).list(
+            request, *args, **kwargs
+        )
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +77,36 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    },
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv(
+            'RESPONSE_CACHE_LOCATION', default='foodgram-responses'
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'tokens': {
+        'BACKEND': os.getenv(
+            'TOKEN_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv(
+            'TOKEN_CACHE_LOCATION', default='foodgram-tokens'
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -112,7 +144,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -136,5 +168,42 @@ DJOSER = {
     }
 }
 
+INGREDIENT_PREFIX_INDEX = (
+    os.getenv('INGREDIENT_PREFIX_INDEX', default='False') == 'True'
+)
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_CACHE_ALIAS = 'responses'
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=300))
+
+RELATION_CACHE_SIZE = int(os.getenv('RELATION_CACHE_SIZE', default=10000))
+RELATION_CACHE_TTL = int(os.getenv('RELATION_CACHE_TTL', default=60))
+
+TOKEN_CACHE_ALIAS = 'tokens'
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=300))
+
+FEED_INBOX_MIN_FOLLOWS = int(os.getenv('FEED_INBOX_MIN_FOLLOWS', default=0))
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', default=10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', default=25_000_000)
+)
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='False') == 'True'
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', default=8))
+
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', default='False') == 'True'
+REQUEST_METRICS_SERVER_TIMING = (
+    os.getenv('REQUEST_METRICS_SERVER_TIMING', default='False') == 'True'
+)
+
 #1
 #2
\ No newline at end of file
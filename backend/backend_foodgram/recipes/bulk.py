@@ -0,0 +1,142 @@
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from users.models import Follow
+from . import cart_totals, counters, feed
+from .models import IngredientQuantity, Recipe, ShoppingCart
+from .relations import MODEL_KINDS, relation_cache
+
+ADDED = 'added'
+ALREADY_ADDED = 'already_added'
+REMOVED = 'removed'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def relation_columns(model):
+    _, field = MODEL_KINDS[model]
+    target = model._meta.get_field(field.replace('_id', '')).related_model
+    quote = connection.ops.quote_name
+    return (
+        quote(model._meta.db_table), quote(field),
+        quote(target._meta.db_table)
+    )
+
+
+def insert_relations(model, user_id, target_ids):
+    """Добавляет связи одним INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Несуществующие цели отсекает SELECT, существующие связи — ON CONFLICT,
+    поэтому возвращаются ровно вставленные id и гонка двойного клика
+    не доходит до IntegrityError.
+    """
+    target_ids = list(target_ids)
+    table, column, targets = relation_columns(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, {column}) '
+            f'SELECT %s, id FROM {targets} '
+            f'WHERE id IN ({placeholders(target_ids)}) '
+            f'ON CONFLICT (user_id, {column}) DO NOTHING '
+            f'RETURNING {column}',
+            [user_id, *target_ids]
+        )
+        inserted = [row[0] for row in cursor.fetchall()]
+    if inserted:
+        relations_changed(model, user_id, inserted, added=True)
+    return inserted
+
+
+def delete_relations(model, user_id, target_ids):
+    target_ids = list(target_ids)
+    table, column, _ = relation_columns(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE user_id = %s '
+            f'AND {column} IN ({placeholders(target_ids)}) '
+            f'RETURNING {column}',
+            [user_id, *target_ids]
+        )
+        deleted = [row[0] for row in cursor.fetchall()]
+    if deleted:
+        relations_changed(model, user_id, deleted, added=False)
+    return deleted
+
+
+def delete_ingredients(recipe_id, quantity_ids=None):
+    """Удаляет ингредиенты рецепта одним DELETE ... RETURNING.
+
+    Сигналы не шлются, итоги корзин вызывающий поправляет сам по
+    возвращённому {id ингредиента: удалённое количество}.
+    """
+    table = connection.ops.quote_name(IngredientQuantity._meta.db_table)
+    sql = f'DELETE FROM {table} WHERE recipe_id = %s'
+    params = [recipe_id]
+    if quantity_ids is not None:
+        quantity_ids = list(quantity_ids)
+        sql += f' AND id IN ({placeholders(quantity_ids)})'
+        params += quantity_ids
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING ingredient_id, amount', params)
+        return dict(cursor.fetchall())
+
+
+def relations_changed(model, user_id, target_ids, added):
+    """Пакетные вставки и удаления не шлют сигналов: обновляем всё явно."""
+    kind, field = MODEL_KINDS[model]
+    counters.change(
+        model,
+        [model(user_id=user_id, **{field: pk}) for pk in target_ids],
+        1 if added else -1
+    )
+    if model is ShoppingCart:
+        if added:
+            cart_totals.add_recipes(user_id, target_ids)
+        else:
+            cart_totals.remove_recipes(user_id, target_ids)
+    if model is Follow:
+        for author_id in target_ids:
+            if added:
+                feed.follow_added(user_id, author_id)
+            else:
+                feed.follow_removed(user_id, author_id)
+    relation_cache.changed(user_id, kind, target_ids, added=added)
+
+
+def recipe_states(model, user_id, recipe_ids):
+    """{id рецепта: есть ли он уже у пользователя} одним запросом."""
+    return dict(Recipe.objects.filter(id__in=recipe_ids).annotate(
+        present=Exists(model.objects.filter(
+            user_id=user_id, recipe_id=OuterRef('pk')
+        ))
+    ).order_by().values_list('id', 'present'))
+
+
+def add_recipes(model, user_id, recipe_ids):
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    states = recipe_states(model, user_id, recipe_ids)
+    new = [pk for pk in recipe_ids if states.get(pk) is False]
+    inserted = set(insert_relations(model, user_id, new)) if new else set()
+    return [
+        {'id': pk, 'status': NOT_FOUND if pk not in states
+         else ADDED if pk in inserted else ALREADY_ADDED}
+        for pk in recipe_ids
+    ]
+
+
+def remove_recipes(model, user_id, recipe_ids):
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    states = recipe_states(model, user_id, recipe_ids)
+    present = [pk for pk in recipe_ids if states.get(pk)]
+    deleted = (
+        set(delete_relations(model, user_id, present)) if present else set()
+    )
+    return [
+        {'id': pk, 'status': NOT_FOUND if pk not in states
+         else REMOVED if pk in deleted else NOT_ADDED}
+        for pk in recipe_ids
+    ]
@@ -0,0 +1,127 @@
+from django.db import connection
+from django.db.models import Sum
+
+from .models import IngredientQuantity, ShoppingCart, ShoppingCartTotal
+
+
+def quoted_tables():
+    quote = connection.ops.quote_name
+    return (
+        quote(ShoppingCartTotal._meta.db_table),
+        quote(IngredientQuantity._meta.db_table),
+        quote(ShoppingCart._meta.db_table),
+    )
+
+
+def upsert_sql(select):
+    totals = quoted_tables()[0]
+    return (
+        f'INSERT INTO {totals} (user_id, ingredient_id, total_amount) '
+        f'{select} '
+        'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+        f'SET total_amount = {totals}.total_amount + EXCLUDED.total_amount'
+    )
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def delete_empty(cursor, column, ids):
+    totals = quoted_tables()[0]
+    cursor.execute(
+        f'DELETE FROM {totals} '
+        f'WHERE total_amount <= 0 AND {column} IN ({placeholders(ids)})',
+        ids
+    )
+
+
+def add_recipes(user_id, recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    _, quantities, _ = quoted_tables()
+    with connection.cursor() as cursor:
+        cursor.execute(upsert_sql(
+            f'SELECT %s, ingredient_id, SUM(amount) FROM {quantities} '
+            f'WHERE recipe_id IN ({placeholders(recipe_ids)}) '
+            'GROUP BY ingredient_id'
+        ), [user_id, *recipe_ids])
+
+
+def remove_recipes(user_id, recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    totals, quantities, _ = quoted_tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {totals} SET total_amount = total_amount - ('
+            f'SELECT SUM(amount) FROM {quantities} '
+            f'WHERE recipe_id IN ({placeholders(recipe_ids)}) '
+            f'AND ingredient_id = {totals}.ingredient_id'
+            f') WHERE user_id = %s AND ingredient_id IN ('
+            f'SELECT ingredient_id FROM {quantities} '
+            f'WHERE recipe_id IN ({placeholders(recipe_ids)}))',
+            [*recipe_ids, user_id, *recipe_ids]
+        )
+        delete_empty(cursor, 'user_id', [user_id])
+
+
+def deltas_sql(deltas):
+    return ' UNION ALL '.join(
+        ['SELECT %s AS ingredient_id, %s AS delta'] * len(deltas)
+    ), [value for item in deltas for value in item]
+
+
+def change_ingredients(recipe_id, deltas):
+    added = [(pk, delta) for pk, delta in deltas.items() if delta > 0]
+    removed = [(pk, delta) for pk, delta in deltas.items() if delta < 0]
+    totals, _, carts = quoted_tables()
+    with connection.cursor() as cursor:
+        if added:
+            changes, params = deltas_sql(added)
+            cursor.execute(upsert_sql(
+                'SELECT cart.user_id, changes.ingredient_id, changes.delta '
+                f'FROM {carts} cart, ({changes}) changes '
+                'WHERE cart.recipe_id = %s'
+            ), [*params, recipe_id])
+        if removed:
+            changes, params = deltas_sql(removed)
+            removed_ids = [pk for pk, _ in removed]
+            cursor.execute(
+                f'UPDATE {totals} SET total_amount = total_amount + ('
+                f'SELECT changes.delta FROM ({changes}) changes '
+                f'WHERE changes.ingredient_id = {totals}.ingredient_id'
+                f') WHERE ingredient_id IN ({placeholders(removed_ids)}) '
+                f'AND user_id IN ('
+                f'SELECT user_id FROM {carts} WHERE recipe_id = %s)',
+                [*params, *removed_ids, recipe_id]
+            )
+            delete_empty(cursor, 'ingredient_id', removed_ids)
+
+
+def live_totals():
+    rows = IngredientQuantity.objects.filter(
+        recipe__shopping_carts__isnull=False
+    ).values_list(
+        'recipe__shopping_carts__user', 'ingredient'
+    ).annotate(total_amount=Sum('amount')).order_by()
+    return {(user, ingredient): total for user, ingredient, total in rows}
+
+
+def stored_totals():
+    rows = ShoppingCartTotal.objects.values_list(
+        'user', 'ingredient', 'total_amount'
+    )
+    return {(user, ingredient): total for user, ingredient, total in rows}
+
+
+def rebuild():
+    ShoppingCartTotal.objects.all().delete()
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(
+            user_id=user, ingredient_id=ingredient, total_amount=total
+        )
+        for (user, ingredient), total in live_totals().items()
+    )
@@ -0,0 +1,86 @@
+import threading
+from collections import Counter
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import CustomUser, Follow
+from .models import Favorite, Recipe, ShoppingCart
+from .versions import bump_version_on_commit
+
+COUNTERS = {
+    Favorite: ((Recipe, 'recipe_id', 'favorites_count'),),
+    ShoppingCart: ((Recipe, 'recipe_id', 'in_carts_count'),),
+    Follow: (
+        (CustomUser, 'following_id', 'followers_count'),
+        (CustomUser, 'user_id', 'following_count'),
+    ),
+    Recipe: ((CustomUser, 'author_id', 'recipes_count'),),
+}
+
+
+class DeletedTargets(threading.local):
+    """Удаляемые рецепты и пользователи: каскад не уменьшает их счётчики."""
+
+    def __init__(self):
+        self.keys = set()
+
+
+deleted_targets = DeletedTargets()
+
+
+def change(model, instances, delta):
+    """Сдвигает на delta счётчики, которые ведут связи model из instances.
+
+    UPDATE через F() не шлёт сигналов, поэтому поколение 'counters'
+    сбрасывает кеш анонимных ответов с этими счётчиками явно.
+    """
+    changed = False
+    for target, field, column in COUNTERS[model]:
+        target_ids = [getattr(instance, field) for instance in instances]
+        if delta < 0:
+            target_ids = [
+                pk for pk in target_ids
+                if (target, pk) not in deleted_targets.keys
+            ]
+        by_times = {}
+        for target_id, times in Counter(target_ids).items():
+            by_times.setdefault(times, []).append(target_id)
+        for times, ids in by_times.items():
+            target.objects.filter(id__in=ids).update(
+                **{column: F(column) + delta * times}
+            )
+            changed = True
+    if changed:
+        bump_version_on_commit('counters')
+
+
+def live_count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('*')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount(dry_run=False):
+    """Сверяет счётчики с таблицами связей и чинит расхождения."""
+    drift = {}
+    for model, counters in COUNTERS.items():
+        for target, field, column in counters:
+            wrong = [
+                target(id=pk, **{column: live})
+                for pk, stored, live in target.objects.annotate(
+                    live=live_count(model, field)
+                ).values_list('id', column, 'live').iterator()
+                if stored != live
+            ]
+            if wrong and not dry_run:
+                target.objects.bulk_update(wrong, [column], batch_size=1000)
+                bump_version_on_commit('counters')
+            drift[f'{target._meta.model_name}.{column}'] = len(wrong)
+    return drift
@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.db import connection
+
+from users.models import CustomUser, Follow
+from .counters import deleted_targets
+from .models import FeedInbox, Recipe
+
+
+def enabled():
+    return settings.FEED_INBOX_MIN_FOLLOWS > 0
+
+
+def quoted_tables():
+    quote = connection.ops.quote_name
+    return (
+        quote(FeedInbox._meta.db_table),
+        quote(Follow._meta.db_table),
+        quote(CustomUser._meta.db_table),
+        quote(Recipe._meta.db_table),
+    )
+
+
+def feed_queryset(user):
+    """Рецепты авторов, на которых подписан user, новые первыми.
+
+    Пользователи с лентой во входящих читают заранее разосланные записи,
+    остальные — рецепты по списку подписок через индекс (author_id, id).
+    """
+    if enabled() and user.feed_inbox:
+        recipes = Recipe.objects.filter(feed_entries__user=user)
+    else:
+        recipes = Recipe.objects.filter(author_id__in=Follow.objects.filter(
+            user=user
+        ).values('following_id'))
+    return recipes.order_by('-id')
+
+
+def fill_sql(where):
+    inbox, follows, users, recipes = quoted_tables()
+    return (
+        f'INSERT INTO {inbox} (user_id, recipe_id) '
+        f'SELECT {follows}.user_id, {recipes}.id FROM {follows} '
+        f'JOIN {users} ON {users}.id = {follows}.user_id '
+        f'JOIN {recipes} ON {recipes}.author_id = {follows}.following_id '
+        f'WHERE {users}.feed_inbox AND {where} '
+        'ON CONFLICT (user_id, recipe_id) DO NOTHING'
+    )
+
+
+def fan_out(recipe):
+    """Раскладывает новый рецепт во входящие подписчиков автора."""
+    if not enabled():
+        return
+    recipes = quoted_tables()[3]
+    with connection.cursor() as cursor:
+        cursor.execute(fill_sql(f'{recipes}.id = %s'), [recipe.id])
+
+
+def follow_added(user_id, author_id):
+    if not enabled():
+        return
+    follows = quoted_tables()[1]
+    switched = CustomUser.objects.filter(
+        pk=user_id, feed_inbox=False,
+        following_count__gte=settings.FEED_INBOX_MIN_FOLLOWS
+    ).update(feed_inbox=True)
+    with connection.cursor() as cursor:
+        if switched:
+            cursor.execute(
+                fill_sql(f'{follows}.user_id = %s'), [user_id]
+            )
+        else:
+            cursor.execute(fill_sql(
+                f'{follows}.user_id = %s AND {follows}.following_id = %s'
+            ), [user_id, author_id])
+
+
+def follow_removed(user_id, author_id):
+    if not enabled() or {
+        (CustomUser, user_id), (CustomUser, author_id)
+    } & deleted_targets.keys:
+        return
+    FeedInbox.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def rebuild():
+    """Заново выбирает пользователей с лентой во входящих и наполняет их."""
+    threshold = settings.FEED_INBOX_MIN_FOLLOWS
+    FeedInbox.objects.all().delete()
+    CustomUser.objects.filter(feed_inbox=True).update(feed_inbox=False)
+    if not enabled():
+        return 0
+    CustomUser.objects.filter(
+        following_count__gte=threshold
+    ).update(feed_inbox=True)
+    with connection.cursor() as cursor:
+        cursor.execute(fill_sql('1 = 1'))
+    return FeedInbox.objects.count()
@@ -0,0 +1,36 @@
+import json
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+
+
+class IntegerArrayField(ArrayField):
+    """Массив целых: integer[] в PostgreSQL, JSON-текст в остальных СУБД."""
+
+    def __init__(self, base_field=None, **kwargs):
+        super().__init__(base_field or models.IntegerField(), **kwargs)
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return super().db_type(connection)
+        return 'text'
+
+    def cast_db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return super().cast_db_type(connection)
+        return 'text'
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor == 'postgresql':
+            return super().get_placeholder(value, compiler, connection)
+        return '%s'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if connection.vendor == 'postgresql' or value is None:
+            return super().get_db_prep_value(value, connection, prepared)
+        return json.dumps(list(value))
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
@@ -0,0 +1,162 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+executor = None
+logger = logging.getLogger(__name__)
+
+
+def variant_name(image_name, variant, extension):
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, 'variants', f'{stem}_{variant}.{extension}'
+    )
+
+
+def render_variants(media_root, image_name):
+    """Выполняется в рабочем процессе: только Pillow и файловая система."""
+    from PIL import Image, ImageOps
+
+    variants = {}
+    with Image.open(os.path.join(media_root, image_name)) as source:
+        source = ImageOps.exif_transpose(source).convert('RGB')
+        for variant, size in VARIANTS.items():
+            image = source.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+            variants[variant] = {}
+            for extension, (image_format, options) in FORMATS.items():
+                name = variant_name(image_name, variant, extension)
+                path = os.path.join(media_root, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                image.save(path, image_format, **options)
+                variants[variant][extension] = name
+    return variants
+
+
+def expected_variants(image_name):
+    return {
+        variant: {
+            extension: variant_name(image_name, variant, extension)
+            for extension in FORMATS
+        }
+        for variant in VARIANTS
+    }
+
+
+def variants_outdated(image_name, variants, storage):
+    """Вариантов нет, набор размеров и форматов сменился или файлы удалены."""
+    expected = expected_variants(image_name)
+    return variants != expected or not all(
+        storage.exists(name)
+        for names in expected.values() for name in names.values()
+    )
+
+
+def store_variants(recipe_id, image_name, variants):
+    from recipes.models import Recipe
+
+    return Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+
+
+def save_variants(recipe_id, image_name, variants):
+    from recipes.versions import bump_version
+
+    try:
+        updated = store_variants(recipe_id, image_name, variants)
+    finally:
+        connection.close()
+    if updated:
+        bump_version('recipes')
+
+
+def existing_variants(image_name):
+    from recipes.models import Recipe
+
+    return Recipe.objects.filter(image=image_name).exclude(
+        image_variants={}
+    ).values_list('image_variants', flat=True).first() or {}
+
+
+def variants_done(pool, recipe_id, image_name, future):
+    # Исключения колбэка concurrent.futures не пробрасывает: пишем их в лог,
+    # а рецепт без вариантов подберёт build_image_variants.
+    try:
+        variants = future.result()
+    except BrokenProcessPool as error:
+        reset_executor(pool, error)
+        logger.error(
+            'Варианты %s рецепта %s потеряны: %r', image_name, recipe_id, error
+        )
+        return
+    except Exception:
+        logger.exception(
+            'Не удалось обработать %s рецепта %s', image_name, recipe_id
+        )
+        return
+    try:
+        save_variants(recipe_id, image_name, variants)
+    except Exception:
+        logger.exception(
+            'Не удалось сохранить варианты %s рецепта %s',
+            image_name, recipe_id
+        )
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=get_context('spawn')
+        )
+    return executor
+
+
+def reset_executor(pool, error):
+    """Сломанный падением процесса пул пересоздаётся при следующей задаче."""
+    global executor
+    if executor is pool:
+        logger.warning('Пул обработки изображений сломан: %r', error)
+        executor = None
+
+
+def enqueue_variants(recipe_id, image_name):
+    if not settings.IMAGE_WORKERS:
+        save_variants(
+            recipe_id, image_name,
+            render_variants(settings.MEDIA_ROOT, image_name)
+        )
+        return
+    pool = get_executor()
+    try:
+        future = pool.submit(
+            render_variants, str(settings.MEDIA_ROOT), image_name
+        )
+    except BrokenProcessPool as error:
+        reset_executor(pool, error)
+        pool = get_executor()
+        future = pool.submit(
+            render_variants, str(settings.MEDIA_ROOT), image_name
+        )
+    future.add_done_callback(
+        lambda future: variants_done(pool, recipe_id, image_name, future)
+    )
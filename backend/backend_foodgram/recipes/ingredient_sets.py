@@ -0,0 +1,59 @@
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import IngredientQuantity, Recipe
+
+
+def update_sql(where):
+    quote = connection.ops.quote_name
+    recipes = quote(Recipe._meta.db_table)
+    quantities = quote(IngredientQuantity._meta.db_table)
+    if connection.vendor == 'postgresql':
+        aggregate = 'ARRAY(SELECT ingredient_id FROM {} WHERE {} ORDER BY 1)'
+    else:
+        aggregate = (
+            "(SELECT coalesce(json_group_array(ingredient_id), '[]') "
+            'FROM (SELECT ingredient_id FROM {} WHERE {} ORDER BY 1))'
+        )
+    return f'UPDATE {recipes} SET ingredient_ids = ' + aggregate.format(
+        quantities, f'{quantities}.recipe_id = {recipes}.id'
+    ) + f' {where}'
+
+
+def update(recipe_ids=None):
+    """Пересобирает массивы ингредиентов рецептов, без аргументов — всех."""
+    if recipe_ids is None:
+        where, params = '', []
+    else:
+        params = list(recipe_ids)
+        if not params:
+            return
+        where = 'WHERE id IN ({})'.format(', '.join(['%s'] * len(params)))
+    with connection.cursor() as cursor:
+        cursor.execute(update_sql(where), params)
+
+
+def filter_recipes(queryset, include=(), exclude=()):
+    """Рецепты со всеми ингредиентами include и без ингредиентов exclude.
+
+    В PostgreSQL это операторы @> и && над массивом под GIN-индексом,
+    в остальных СУБД — подзапросы к IngredientQuantity.
+    """
+    include, exclude = sorted(set(include)), sorted(set(exclude))
+    if connection.vendor == 'postgresql':
+        if include:
+            queryset = queryset.filter(ingredient_ids__contains=include)
+        if exclude:
+            queryset = queryset.exclude(ingredient_ids__overlap=exclude)
+        return queryset
+    if include:
+        queryset = queryset.filter(id__in=IngredientQuantity.objects.filter(
+            ingredient_id__in=include
+        ).values('recipe_id').annotate(
+            matched=Count('id')
+        ).filter(matched=len(include)).values('recipe_id'))
+    if exclude:
+        queryset = queryset.filter(~Q(id__in=IngredientQuantity.objects.filter(
+            ingredient_id__in=exclude
+        ).values('recipe_id')))
+    return queryset
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+from recipes.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит варианты изображений рецептов, у которых их нет или они '
+        'устарели: задача потерялась при падении процесса, сменились '
+        'размеры или форматы, файлы вариантов удалены.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько рецептов нужно обработать.'
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        stale = [
+            (recipe_id, image)
+            for recipe_id, image, variants in Recipe.objects.exclude(
+                image=''
+            ).values_list('id', 'image', 'image_variants').iterator()
+            if images.variants_outdated(image, variants, storage)
+        ]
+        if options['dry_run']:
+            self.stdout.write(
+                f'Рецептов без актуальных вариантов: {len(stale)}.'
+            )
+            return
+        # Одинаковые изображения хранятся одним файлом: рендерим его раз.
+        rendered = {}
+        built = failed = 0
+        for recipe_id, image in stale:
+            if image not in rendered:
+                try:
+                    rendered[image] = images.render_variants(
+                        settings.MEDIA_ROOT, image
+                    )
+                except Exception as error:
+                    rendered[image] = None
+                    self.stderr.write(
+                        f'Не удалось обработать {image}: {error!r}'
+                    )
+            if rendered[image] is None:
+                failed += 1
+                continue
+            built += images.store_variants(recipe_id, image, rendered[image])
+        if built:
+            bump_version('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {built}, изображений: '
+            f'{sum(1 for variants in rendered.values() if variants)}, '
+            f'с ошибками: {failed}.'
+        ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes import cart_totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет итоги корзин покупок с живой агрегацией '
+        'и при --repair пересобирает их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Пересобрать таблицу итогов с нуля.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            live = cart_totals.live_totals()
+            stored = cart_totals.stored_totals()
+            diff = sorted(
+                (key, stored.get(key), live.get(key))
+                for key in live.keys() | stored.keys()
+                if stored.get(key) != live.get(key)
+            )
+            for (user, ingredient), stored_total, live_total in diff[:20]:
+                self.stdout.write(
+                    f'user={user} ingredient={ingredient}: '
+                    f'сохранено {stored_total}, должно быть {live_total}'
+                )
+            if options['repair']:
+                cart_totals.rebuild()
+        if not diff:
+            self.stdout.write(self.style.SUCCESS(
+                f'Итоги корзин согласованы: {len(live)} строк.'
+            ))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено расхождений: {len(diff)}.'
+            ))
+        else:
+            raise CommandError(
+                f'Найдено расхождений: {len(diff)}, '
+                'запустите с --repair.'
+            )
@@ -0,0 +1,65 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name).replace('\\', '/')
+    for name in directories:
+        yield from walk(storage, os.path.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает ссылки рецептов на изображения и удаляет файлы, '
+        'на которые никто не ссылается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help='Не трогать файлы моложе стольких секунд.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        references = Counter()
+        recipes = Recipe.objects.values_list('image', 'image_variants')
+        for image, variants in recipes.iterator():
+            references[image] += 1
+            for names in variants.values():
+                references.update(names.values())
+        if not storage.exists('recipes'):
+            self.stdout.write('Каталог изображений пуст.')
+            return
+        deadline = timezone.now() - timedelta(seconds=options['grace'])
+        blobs = deleted = freed = 0
+        for name in walk(storage, 'recipes'):
+            blobs += 1
+            if references[name]:
+                continue
+            if storage.get_modified_time(name) > deadline:
+                continue
+            deleted += 1
+            freed += storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(f'Будет удалён {name}')
+            else:
+                storage.delete(name)
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов: {blobs}, используемых несколькими рецептами: {shared}, '
+            f'{"к удалению" if options["dry_run"] else "удалено"}: '
+            f'{deleted} ({freed / 2 ** 20:.1f} МБ).'
+        ))
@@ -0,0 +1,165 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+from recipes.versions import bump_version
+
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if row:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as file:
+        buffer = ''
+        started = False
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            buffer += chunk
+            position = 0
+            while True:
+                while (
+                    position < len(buffer)
+                    and buffer[position] in ' \t\r\n,]'
+                ):
+                    position += 1
+                if not started and position < len(buffer):
+                    if buffer[position] != '[':
+                        raise CommandError('Ожидается JSON-массив!')
+                    started = True
+                    position += 1
+                    continue
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                yield item['name'], item['measurement_unit']
+            buffer = buffer[position:]
+            if not chunk:
+                if buffer.strip():
+                    raise CommandError('Файл JSON обрывается!')
+                return
+
+
+class RowsReader(io.TextIOBase):
+    """Файловый интерфейс над генератором строк для COPY."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                break
+            line = io.StringIO()
+            csv.writer(line).writerow(row)
+            self.buffer += line.getvalue()
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к ingredients.csv/.json')
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файла, по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT.'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='PostgreSQL: COPY во временную таблицу и слияние.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        readers = {'csv': read_csv, 'json': read_json}
+        if file_format not in readers:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        rows = readers[file_format](path)
+        started = time.perf_counter()
+        try:
+            if options['copy']:
+                if connection.vendor != 'postgresql':
+                    raise CommandError('--copy доступен только в PostgreSQL!')
+                total = self.copy_rows(rows)
+            else:
+                total = self.upsert_rows(rows, options['batch_size'])
+        except (OSError, KeyError, IndexError) as error:
+            raise CommandError(f'Ошибка чтения {path}: {error!r}')
+        bump_version('ingredients')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {total} за {elapsed:.3f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с)'
+        ))
+
+    def upsert_rows(self, rows, batch_size):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        batch_size = connection.ops.bulk_batch_size(
+            ['name', 'measurement_unit'], [None] * batch_size
+        ) or batch_size
+        total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            while True:
+                batch = dict(islice(rows, batch_size))
+                if not batch:
+                    return total
+                values = ', '.join(['(%s, %s)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} (name, measurement_unit) '
+                    f'VALUES {values} '
+                    'ON CONFLICT (name) DO UPDATE '
+                    'SET measurement_unit = EXCLUDED.measurement_unit',
+                    [value for row in batch.items() for value in row]
+                )
+                total += len(batch)
+
+    def copy_rows(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import ('
+                'name varchar(200), measurement_unit varchar(200)'
+                ') ON COMMIT DROP'
+            )
+            cursor.cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                RowsReader(rows), size=CHUNK_SIZE
+            )
+            cursor.execute('SELECT count(*) FROM ingredient_import')
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT ON (name) name, measurement_unit '
+                'FROM ingredient_import ORDER BY name '
+                'ON CONFLICT (name) DO UPDATE '
+                'SET measurement_unit = EXCLUDED.measurement_unit'
+            )
+        return total
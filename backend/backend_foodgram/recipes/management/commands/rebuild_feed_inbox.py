@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново выбирает пользователей с лентой во входящих по порогу '
+        'FEED_INBOX_MIN_FOLLOWS и наполняет их ленты.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            entries = feed.rebuild()
+        if not feed.enabled():
+            self.stdout.write(self.style.WARNING(
+                'FEED_INBOX_MIN_FOLLOWS не задан, входящие очищены.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей во входящих: {entries}, порог подписок '
+            f'{settings.FEED_INBOX_MIN_FOLLOWS}.'
+        ))
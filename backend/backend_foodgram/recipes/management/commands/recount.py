@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, корзин, рецептов и подписчиков '
+        'по таблицам связей и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = counters.recount(dry_run=options['dry_run'])
+        for counter, wrong in drift.items():
+            self.stdout.write(f'{counter}: расхождений {wrong}')
+        total = sum(drift.values())
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Счётчики согласованы.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'Найдено расхождений: {total}, запустите без --dry-run.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено расхождений: {total}.'
+            ))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.seeding import SEED_PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует пользователей, рецепты и перекошенные графы подписок, '
+        'избранного и корзин для нагрузочного тестирования.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на пользователя.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Избранных рецептов на пользователя.'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=8,
+            help='Рецептов в корзине на пользователя.'
+        )
+        parser.add_argument(
+            '--min-ingredients', type=int, default=10
+        )
+        parser.add_argument(
+            '--max-ingredients', type=int, default=20
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа, 0 — равномерное.'
+        )
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = seed(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients=options['ingredients'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            cart=options['cart'],
+            ingredients_per_recipe=(
+                options['min_ingredients'], options['max_ingredients']
+            ),
+            zipf=options['zipf'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{name}: {count}' for name, count in counts.items())
+            + f' за {time.perf_counter() - started:.1f} с. '
+            f'Пароль пользователей {options["prefix"]}N@example.com: '
+            f'{SEED_PASSWORD}'
+        ))
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.13 on 2026-10-17 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_totals(apps, schema_editor):
+    IngredientQuantity = apps.get_model('recipes', 'IngredientQuantity')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    rows = IngredientQuantity.objects.filter(
+        recipe__shopping_carts__isnull=False
+    ).values_list(
+        'recipe__shopping_carts__user', 'ingredient'
+    ).annotate(total_amount=models.Sum('amount')).order_by()
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(
+            user_id=user, ingredient_id=ingredient, total_amount=total
+        )
+        for user, ingredient, total in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог корзины покупок',
+                'verbose_name_plural': 'Итоги корзин покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='Ингредиент уже учтён в корзине!'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.2.13 on 2026-10-17 04:46
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Копия recipes.search.update_sql на момент миграции: код приложения
+# может меняться, а миграция должна давать тот же результат.
+FILL_SEARCH_VECTOR = (
+    'UPDATE recipes_recipe SET search_vector = '
+    "setweight(to_tsvector('russian', "
+    "coalesce(recipes_recipe.name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(ingredient.name, ' ') "
+    'FROM recipes_ingredientquantity '
+    'JOIN recipes_ingredient ingredient '
+    'ON ingredient.id = recipes_ingredientquantity.ingredient_id '
+    'WHERE recipes_ingredientquantity.recipe_id = recipes_recipe.id'
+    "), '')), 'B') || "
+    "setweight(to_tsvector('russian', "
+    "coalesce(recipes_recipe.text, '')), 'C')"
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """GIN-индекс поиска и, если pg_trgm доступно, триграммный индекс.
+
+    CREATE EXTENSION pg_trgm может выполнить владелец базы в PostgreSQL 13
+    и новее (расширение доверенное), в более старых версиях — только
+    суперпользователь. Без таких прав создайте расширение заранее:
+    уже установленное расширение миграция не создаёт повторно.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX recipes_recipe_search_vector_gin '
+        'ON recipes_recipe USING gin (search_vector)'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT installed_version IS NOT NULL '
+            "FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        trigram = cursor.fetchone()
+    if trigram is not None:
+        if not trigram[0]:
+            schema_editor.execute('CREATE EXTENSION pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX recipes_recipe_name_trgm '
+            'ON recipes_recipe USING gin (name gin_trgm_ops)'
+        )
+    schema_editor.execute(FILL_SEARCH_VECTOR)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin'
+    )
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_recipe_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.13 on 2026-10-17 04:49
+
+from django.db import migrations, models
+import recipes.fields
+
+# Копия recipes.ingredient_sets.update_sql на момент миграции.
+FILL_INGREDIENT_IDS = {
+    'postgresql': (
+        'UPDATE recipes_recipe SET ingredient_ids = ARRAY('
+        'SELECT ingredient_id FROM recipes_ingredientquantity '
+        'WHERE recipes_ingredientquantity.recipe_id = recipes_recipe.id '
+        'ORDER BY 1)'
+    ),
+    'sqlite': (
+        'UPDATE recipes_recipe SET ingredient_ids = ('
+        "SELECT coalesce(json_group_array(ingredient_id), '[]') "
+        'FROM (SELECT ingredient_id FROM recipes_ingredientquantity '
+        'WHERE recipes_ingredientquantity.recipe_id = recipes_recipe.id '
+        'ORDER BY 1))'
+    ),
+}
+
+
+def fill_ingredient_ids(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    schema_editor.execute(
+        FILL_INGREDIENT_IDS.get(vendor, FILL_INGREDIENT_IDS['sqlite'])
+    )
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipes_recipe_ingredient_ids_gin '
+            'ON recipes_recipe USING gin (ingredient_ids)'
+        )
+
+
+def drop_ingredient_ids_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipes_recipe_ingredient_ids_gin'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=recipes.fields.IntegerArrayField(base_field=models.IntegerField(), blank=True, default=list, editable=False, size=None, verbose_name='Идентификаторы ингредиентов'),
+        ),
+        migrations.RunPython(fill_ingredient_ids, drop_ingredient_ids_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.13 on 2026-10-17 04:52
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Favorite', 'recipe', 'recipes', 'Recipe', 'favorites_count'),
+    ('recipes', 'ShoppingCart', 'recipe', 'recipes', 'Recipe',
+     'in_carts_count'),
+    ('users', 'Follow', 'following', 'users', 'CustomUser',
+     'followers_count'),
+    ('recipes', 'Recipe', 'author', 'users', 'CustomUser', 'recipes_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, name, field, target_app, target_name, column in COUNTERS:
+        model = apps.get_model(app, name)
+        apps.get_model(target_app, target_name).objects.update(**{
+            column: Coalesce(Subquery(
+                model.objects.filter(**{field: OuterRef('pk')}).order_by(
+                ).values(field).annotate(total=Count('*')).values('total'),
+                output_field=IntegerField()
+            ), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_ingredient_ids'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-in_carts_count', '-id'], name='recipe_in_carts_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.13 on 2026-10-17 05:31
+
+from django.db import migrations, models
+from django.utils import timezone
+
+CATALOGS = ('recipes', 'tags', 'ingredients', 'users')
+
+
+def create_versions(apps, schema_editor):
+    DataVersion = apps.get_model('recipes', 'DataVersion')
+    now = timezone.now()
+    DataVersion.objects.bulk_create(
+        DataVersion(name=name, version=1, modified=now) for name in CATALOGS
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_feed_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Набор данных')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('modified', models.DateTimeField(verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия данных',
+                'verbose_name_plural': 'Версии данных',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
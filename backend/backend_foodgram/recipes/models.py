@@ -1,7 +1,12 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 
 from users.models import CustomUser
+from .fields import IntegerArrayField
+from .storage import recipe_image_storage
 
 
 class Tag(models.Model):
@@ -40,6 +45,43 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    @staticmethod
+    def related_lookups():
+        return (
+            'tags',
+            Prefetch(
+                'ingredientquantity_set',
+                queryset=IngredientQuantity.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            *self.related_lookups()
+        )
+
+    def first_per_author(self, author_ids, limit):
+        if not author_ids:
+            # Пустой IN не превращается в SQL: запрос заведомо пуст.
+            return self.none()
+        ranked = self.filter(author_id__in=author_ids).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=F('id').desc()
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            'WHERE row_number <= %s ORDER BY id DESC',
+            (*params, limit)
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         CustomUser, 
@@ -53,9 +95,15 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=recipe_image_storage,
         blank=False,
         verbose_name='Изображение рецепта'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Уменьшенные копии изображения'
+    )
     text = models.TextField(max_length=200, verbose_name='Описание рецепта')
     ingredients = models.ManyToManyField(
         Ingredient, through='IngredientQuantity', verbose_name='Ингредиенты'
@@ -72,9 +120,40 @@ class Recipe(models.Model):
         ],
         verbose_name='Время приготовления в минутах'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения'
+    )
+    ingredient_ids = IntegerArrayField(
+        default=list, blank=True, editable=False,
+        verbose_name='Идентификаторы ингредиентов'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В корзинах'
+    )
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=['-in_carts_count', '-id'],
+                name='recipe_in_carts_count_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'], name='recipe_author_id_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -159,3 +238,70 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe}{self.user}'
+
+
+class FeedInbox(models.Model):
+    """Рецепты, разосланные при публикации в ленты активных подписчиков."""
+
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE,
+        related_name='feed_entries', verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='feed_entries', verbose_name='Рецепт'
+    )
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='Рецепт уже в ленте подписчика!'
+        )
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE,
+        related_name='shopping_cart_totals', verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField(verbose_name='Общее количество')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='Ингредиент уже учтён в корзине!'
+        )
+        ]
+        verbose_name = 'Итог корзины покупок'
+        verbose_name_plural = 'Итоги корзин покупок'
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.total_amount}'
+
+
+class DataVersion(models.Model):
+    """Версия и время изменения набора данных, общие для всех процессов."""
+
+    name = models.CharField(
+        max_length=100, unique=True, verbose_name='Набор данных'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0, verbose_name='Версия'
+    )
+    modified = models.DateTimeField(verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name} {self.version}'
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from users.models import Follow
+from .models import Favorite, ShoppingCart
+from .versions import bump_version, get_version
+
+KINDS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+    'following': (Follow, 'following_id'),
+}
+MODEL_KINDS = {model: (kind, field) for kind, (model, field) in KINDS.items()}
+
+
+class Relations:
+    __slots__ = ('version', 'loaded_at', *KINDS)
+
+    def __init__(self, version, **sets):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        for kind in KINDS:
+            setattr(self, kind, sets[kind])
+
+
+def version_name(user_id):
+    return f'relations:{user_id}'
+
+
+class RelationCache:
+    """LRU-кеш избранного, корзины и подписок пользователей в памяти."""
+
+    def __init__(self, max_users, ttl):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, user_id, version):
+        return Relations(version, **{
+            kind: set(model.objects.filter(user_id=user_id).values_list(
+                field, flat=True
+            ))
+            for kind, (model, field) in KINDS.items()
+        })
+
+    def get(self, user_id, version=None):
+        if version is None:
+            version = get_version(version_name(user_id))
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if (
+                entry is not None and entry.version == version
+                and time.monotonic() - entry.loaded_at < self.ttl
+            ):
+                self.entries.move_to_end(user_id)
+                return entry
+        entry = self.load(user_id, version)
+        with self.lock:
+            self.entries[user_id] = entry
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+        return entry
+
+    def changed(self, user_id, kind, pks, added):
+        pks = list(pks)
+
+        def apply():
+            version = bump_version(version_name(user_id))
+            with self.lock:
+                entry = self.entries.get(user_id)
+                if entry is None:
+                    return
+                if entry.version != version - 1:
+                    del self.entries[user_id]
+                    return
+                members = getattr(entry, kind)
+                if added:
+                    members.update(pks)
+                else:
+                    members.difference_update(pks)
+                entry.version = version
+
+        transaction.on_commit(apply)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+relation_cache = RelationCache(
+    settings.RELATION_CACHE_SIZE, settings.RELATION_CACHE_TTL
+)
+
+
+def user_relations(user):
+    # Версия связей лежит в базе: сверяем её один раз на объект
+    # пользователя, то есть на запрос, а не на каждый рецепт в выдаче.
+    # Снимок токена из кеша приносит её вместе с версией токенов.
+    if user is None or user.is_anonymous:
+        return None
+    if getattr(user, 'relations', None) is None:
+        user.relations = relation_cache.get(
+            user.pk, getattr(user, 'relations_version', None)
+        )
+    return user.relations
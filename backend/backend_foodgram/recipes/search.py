@@ -0,0 +1,72 @@
+from functools import lru_cache
+
+from django.db import connection
+
+from .models import Ingredient, IngredientQuantity, Recipe
+
+SEARCH_CONFIG = 'russian'
+
+
+def quoted_tables():
+    quote = connection.ops.quote_name
+    return (
+        quote(Recipe._meta.db_table),
+        quote(IngredientQuantity._meta.db_table),
+        quote(Ingredient._meta.db_table),
+    )
+
+
+def enabled():
+    return connection.vendor == 'postgresql'
+
+
+@lru_cache(maxsize=None)
+def trigram_enabled():
+    if not enabled():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def update_sql(where):
+    recipes, quantities, ingredients = quoted_tables()
+    return (
+        f'UPDATE {recipes} SET search_vector = '
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+        f"coalesce({recipes}.name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(("
+        f"SELECT string_agg(ingredient.name, ' ') FROM {quantities} "
+        f'JOIN {ingredients} ingredient '
+        f'ON ingredient.id = {quantities}.ingredient_id '
+        f"WHERE {quantities}.recipe_id = {recipes}.id), '')), 'B') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+        f"coalesce({recipes}.text, '')), 'C') "
+        f'{where}'
+    )
+
+
+def update_vectors(recipe_ids=None):
+    """Пересчитывает поисковые векторы рецептов, без аргументов — всех."""
+    if not enabled():
+        return
+    if recipe_ids is None:
+        where, params = '', []
+    else:
+        params = list(recipe_ids)
+        if not params:
+            return
+        where = 'WHERE id IN ({})'.format(', '.join(['%s'] * len(params)))
+    with connection.cursor() as cursor:
+        cursor.execute(update_sql(where), params)
+
+
+def update_ingredient_vectors(ingredient_id):
+    if not enabled():
+        return
+    quantities = quoted_tables()[1]
+    with connection.cursor() as cursor:
+        cursor.execute(update_sql(
+            f'WHERE id IN (SELECT recipe_id FROM {quantities} '
+            'WHERE ingredient_id = %s)'
+        ), [ingredient_id])
@@ -0,0 +1,212 @@
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from users.models import CustomUser, Follow
+from . import cart_totals, counters, feed, ingredient_sets, search
+from .models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                     ShoppingCart, Tag)
+from .relations import relation_cache
+from .versions import bump_version
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+UNITS = ('г', 'кг', 'мл', 'шт', 'ст. л.', 'по вкусу')
+SEED_PASSWORD = 'seed-password'
+SEED_IMAGE = 'recipes/seed.png'
+BATCH_SIZE = 1000
+
+
+class ZipfSampler:
+    """Выбирает элементы с вероятностью, убывающей как 1 / rank ** s."""
+
+    def __init__(self, generator, items, exponent):
+        self.generator = generator
+        self.items = list(items)
+        generator.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+
+    def choice(self):
+        return self.generator.choices(
+            self.items, cum_weights=self.cum_weights
+        )[0]
+
+    def sample(self, count, exclude=None):
+        count = min(count, len(self.items) - (exclude is not None))
+        chosen = set()
+        for _ in range(count * 20):
+            if len(chosen) >= count:
+                break
+            item = self.choice()
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+
+def ensure_tags():
+    for name, color, slug in TAGS:
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )
+    return list(Tag.objects.values_list('id', flat=True))
+
+
+def ensure_ingredients(count):
+    existing = Ingredient.objects.count()
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(
+                name=f'Ингредиент {number}',
+                measurement_unit=UNITS[number % len(UNITS)]
+            )
+            for number in range(existing, count)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    return list(Ingredient.objects.values_list('id', flat=True))
+
+
+def create_users(count, prefix):
+    password = make_password(SEED_PASSWORD)
+    start = CustomUser.objects.filter(
+        username__startswith=prefix
+    ).count()
+    CustomUser.objects.bulk_create(
+        (
+            CustomUser(
+                email=f'{prefix}{number}@example.com',
+                username=f'{prefix}{number}',
+                first_name='Имя',
+                last_name=f'Фамилия {number}',
+                password=password
+            )
+            for number in range(start, start + count)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    return list(CustomUser.objects.filter(
+        username__startswith=prefix
+    ).order_by('id').values_list('id', flat=True))
+
+
+def create_recipes(generator, authors, count, tag_ids, ingredient_ids,
+                   ingredients_per_recipe):
+    """authors — ZipfSampler по пользователям."""
+    first = Recipe.objects.order_by('-id').values_list(
+        'id', flat=True
+    ).first() or 0
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author_id=authors.choice(),
+                name=f'Рецепт {number}',
+                image=SEED_IMAGE,
+                text='Описание рецепта.',
+                cooking_time=generator.randint(5, 120)
+            )
+            for number in range(count)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    recipe_ids = list(Recipe.objects.filter(id__gt=first).order_by(
+        'id'
+    ).values_list('id', flat=True))
+    low, high = ingredients_per_recipe
+    IngredientQuantity.objects.bulk_create(
+        (
+            IngredientQuantity(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=generator.randint(1, 500)
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in generator.sample(
+                ingredient_ids,
+                min(generator.randint(low, high), len(ingredient_ids))
+            )
+        ),
+        batch_size=BATCH_SIZE
+    )
+    RecipeTag = Recipe.tags.through
+    RecipeTag.objects.bulk_create(
+        (
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in generator.sample(
+                tag_ids, generator.randint(1, len(tag_ids))
+            )
+        ),
+        batch_size=BATCH_SIZE
+    )
+    return recipe_ids
+
+
+def create_relations(model, field, user_ids, targets, per_user):
+    objects = []
+    for user_id in user_ids:
+        chosen = targets.sample(
+            per_user, exclude=user_id if model is Follow else None
+        )
+        objects.extend(
+            model(user_id=user_id, **{field: target}) for target in chosen
+        )
+    model.objects.bulk_create(
+        objects, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(objects)
+
+
+@transaction.atomic
+def seed(users=50, recipes=200, ingredients=300, follows=10, favorites=15,
+         cart=5, ingredients_per_recipe=(10, 20), zipf=0, prefix='seed',
+         seed=0):
+    """Заполняет базу связанными данными пакетными вставками.
+
+    При zipf > 0 авторы рецептов, подписки, избранное и корзины
+    распределены по закону Ципфа: немногие популярные авторы и рецепты
+    собирают большую часть связей.
+    """
+    generator = random.Random(seed)
+    tag_ids = ensure_tags()
+    ingredient_ids = ensure_ingredients(ingredients)
+    user_ids = create_users(users, prefix)
+    authors = ZipfSampler(generator, user_ids, zipf)
+    recipe_ids = create_recipes(
+        generator, authors, recipes, tag_ids, ingredient_ids,
+        ingredients_per_recipe
+    )
+    popular_recipes = ZipfSampler(generator, recipe_ids, zipf)
+    counts = {
+        'users': len(user_ids),
+        'recipes': len(recipe_ids),
+        'follows': create_relations(
+            Follow, 'following_id', user_ids, authors, follows
+        ),
+        'favorites': create_relations(
+            Favorite, 'recipe_id', user_ids, popular_recipes, favorites
+        ),
+        'cart': create_relations(
+            ShoppingCart, 'recipe_id', user_ids, popular_recipes, cart
+        ),
+    }
+    cart_totals.rebuild()
+    counters.recount()
+    feed.rebuild()
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        ingredient_sets.update(batch)
+        search.update_vectors(batch)
+
+    def invalidate():
+        for name in ('recipes', 'tags', 'ingredients', 'users', 'counters'):
+            bump_version(name)
+        relation_cache.clear()
+
+    transaction.on_commit(invalidate)
+    return counts
@@ -0,0 +1,151 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from users.models import CustomUser, Follow
+from . import cart_totals, counters, feed, ingredient_sets, search
+from .models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                     ShoppingCart, Tag)
+from .relations import MODEL_KINDS, relation_cache
+from .versions import bump_version_on_commit
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version_on_commit('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        search.update_ingredient_vectors(instance.id)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    bump_version_on_commit('tags')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientQuantity)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_changed(**kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'text'} & update_fields:
+        search.update_vectors([instance.id])
+
+
+@receiver((post_save, post_delete), sender=IngredientQuantity)
+def ingredient_quantity_changed(instance, **kwargs):
+    ingredient_sets.update([instance.recipe_id])
+    search.update_vectors([instance.recipe_id])
+
+
+@receiver((post_save, post_delete), sender=CustomUser)
+def user_changed(update_fields=None, **kwargs):
+    if update_fields != frozenset(['last_login']):
+        bump_version_on_commit('users')
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(instance, created, **kwargs):
+    if created:
+        cart_totals.add_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(instance, **kwargs):
+    cart_totals.remove_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_init, sender=IngredientQuantity)
+def ingredient_quantity_loaded(instance, **kwargs):
+    instance.loaded_values = (instance.ingredient_id, instance.amount)
+
+
+@receiver(post_save, sender=IngredientQuantity)
+def ingredient_quantity_saved(instance, created, **kwargs):
+    deltas = {instance.ingredient_id: instance.amount}
+    if not created:
+        ingredient_id, amount = instance.loaded_values
+        deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+    cart_totals.change_ingredients(instance.recipe_id, deltas)
+    instance.loaded_values = (instance.ingredient_id, instance.amount)
+
+
+@receiver(post_delete, sender=IngredientQuantity)
+def ingredient_quantity_deleted(instance, **kwargs):
+    cart_totals.change_ingredients(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def relation_saved(sender, instance, created, **kwargs):
+    if created:
+        kind, field = MODEL_KINDS[sender]
+        relation_cache.changed(
+            instance.user_id, kind, [getattr(instance, field)], added=True
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def relation_deleted(sender, instance, **kwargs):
+    kind, field = MODEL_KINDS[sender]
+    relation_cache.changed(
+        instance.user_id, kind, [getattr(instance, field)], added=False
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+@receiver(pre_delete, sender=CustomUser)
+def counted_target_deleting(sender, instance, **kwargs):
+    counters.deleted_targets.keys.add((sender, instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=CustomUser)
+def counted_target_deleted(sender, instance, **kwargs):
+    counters.deleted_targets.keys.discard((sender, instance.pk))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=Recipe)
+def counted_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(sender, [instance], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Recipe)
+def counted_deleted(sender, instance, **kwargs):
+    counters.change(sender, [instance], -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(instance, created, **kwargs):
+    if created:
+        feed.follow_added(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    feed.follow_removed(instance.user_id, instance.following_id)
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из sha256 содержимого."""
+
+    def content_name(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            content.seek(0)
+            for chunk in content.chunks():
+                sha256.update(chunk)
+            content.seek(0)
+            digest = content.sha256 = sha256.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension
+        ).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            # Свежее время изменения не даёт collect_recipe_images удалить
+            # файл, на который ссылка появится только после его подсчёта.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+        return name
+
+    def _save(self, name, content):
+        partial = super()._save(f'{name}.part-{uuid.uuid4().hex}', content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
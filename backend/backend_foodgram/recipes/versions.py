@@ -0,0 +1,73 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import DataVersion
+
+
+def get_stamps(*names):
+    """{имя: (версия, время изменения)} одним запросом.
+
+    Отметки лежат в базе, поэтому изменение, сделанное в одном процессе
+    (воркере gunicorn или команде управления), сразу видят все остальные.
+    """
+    stamps = {name: (0, None) for name in names}
+    for name, version, modified in DataVersion.objects.filter(
+        name__in=names
+    ).values_list('name', 'version', 'modified'):
+        stamps[name] = (version, modified.timestamp())
+    return stamps
+
+
+def get_version(name):
+    return get_stamps(name)[name][0]
+
+
+def get_modified(name):
+    return get_stamps(name)[name][1]
+
+
+def bump_version(name):
+    table = connection.ops.quote_name(DataVersion._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (name, version, modified) '
+            'VALUES (%s, 1, %s) '
+            f'ON CONFLICT (name) DO UPDATE SET version = {table}.version + 1, '
+            'modified = EXCLUDED.modified '
+            'RETURNING version',
+            [name, connection.ops.adapt_datetimefield_value(timezone.now())]
+        )
+        return cursor.fetchone()[0]
+
+
+class PendingVersions:
+    """Версии, которые поднимаются после коммита атомарного блока."""
+
+    def __init__(self, block):
+        self.block = block
+        self.names = set()
+
+    def __call__(self):
+        for name in sorted(self.names):
+            bump_version(name)
+
+
+def bump_version_on_commit(name):
+    # Сигналы рецепта, его ингредиентов и тегов срабатывают в одной
+    # транзакции много раз, а строка версии горячая: копим имена
+    # по атомарному блоку и поднимаем каждую версию одним запросом.
+    # Колбэк ищем в run_on_commit: после отката точки сохранения
+    # его там нет, и регистрируется новый. Блоки atomic(savepoint=False)
+    # (None в savepoint_ids) откатываются вместе с внешним.
+    if not connection.in_atomic_block:
+        transaction.on_commit(lambda: bump_version(name))
+        return
+    block = tuple(filter(None, connection.savepoint_ids))
+    pending = next((
+        callback for _, callback in connection.run_on_commit
+        if isinstance(callback, PendingVersions) and callback.block == block
+    ), None)
+    if pending is None:
+        pending = PendingVersions(block)
+        transaction.on_commit(pending)
+    pending.names.add(name)
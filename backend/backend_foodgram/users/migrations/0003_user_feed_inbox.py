@@ -0,0 +1,38 @@
+# Generated by Django 3.2.13 on 2026-10-17 04:55
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_following_count(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    apps.get_model('users', 'CustomUser').objects.update(
+        following_count=Coalesce(Subquery(
+            Follow.objects.filter(user=OuterRef('pk')).order_by().values(
+                'user'
+            ).annotate(total=Count('*')).values('total'),
+            output_field=IntegerField()
+        ), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='feed_inbox',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Лента собирается во входящие'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.RunPython(fill_following_count, migrations.RunPython.noop),
+    ]
@@ -23,9 +23,26 @@ class CustomUser(AbstractUser):
         max_length=150,
         verbose_name='Фамилия пользователя'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписок'
+    )
+    feed_inbox = models.BooleanField(
+        default=False, editable=False,
+        verbose_name='Лента собирается во входящие'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    # Поля, которые меняются через update() в обход save() и сигналов.
+    DENORMALIZED_FIELDS = (
+        'recipes_count', 'followers_count', 'following_count', 'feed_inbox'
+    )
 
     class Meta:
         ordering = ['-id']
@@ -35,6 +52,14 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    def refresh_from_db(self, using=None, fields=None):
+        # Отложенные поля догружаются одним запросом, а не по одному.
+        if fields is not None:
+            deferred = self.get_deferred_fields()
+            if deferred.intersection(fields):
+                fields = deferred.union(fields)
+        super().refresh_from_db(using, fields)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(